@@ -0,0 +1,114 @@
+"""
+Benchmark of the cold import time of the modules of the project.
+
+Every module is imported in a fresh Python process (as in a short-lived batch job or CLI call),
+several times; the best and the median time are reported, together with the heavy backends
+(spacy, benepar, torch, sklearn, xgboost, keras, tensorflow) which the import loaded.
+The heavy backends should be loaded only when a feature or a model which needs them is used.
+
+Usage (from the root of the repository):
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 10 --output import_times.json
+    python benchmarks/import_time.py --baseline import_times.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> directory added to sys.path (the directory from which the notebooks import it)
+MODULES = {
+    'classic_features': 'features',
+    'non_classic_features': 'features',
+    'feature_graph': 'features',
+    'feature_extractor': 'features',
+    'feature_matrix': 'features',
+    'formulas.readability_formulas': '.',
+    'comparison.bootstrap': '.',
+    'comparison.permutation': '.',
+    'ml_models.models.random_forest': '.',
+    'ml_models.models.xgboost': '.',
+    'ml_models.models.support_vector_machine': '.',
+    'ml_models.models.multilayer_perceptron': '.',
+    'ml_models.models.predictor': '.',
+    'ml_models.models.utils.hyperparemeter_optimization': '.',
+    'ml_models.models.utils.evaluation': '.',
+}
+
+HEAVY_MODULES = ['spacy', 'pyphen', 'benepar', 'torch', 'sklearn', 'scipy', 'xgboost', 'keras', 'tensorflow']
+
+# code run in the fresh process; prints the import time and the loaded heavy modules
+_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'time': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, path, repeat=5):
+    """
+    Imports the module in repeat fresh processes.
+
+    :returns: dict with the best and the median import time (in seconds) and the loaded heavy modules
+    """
+
+    times = list()
+    loaded = list()
+    for _ in range(repeat):
+        script = _SCRIPT.format(path=os.path.join(ROOT, path), module=module, heavy=HEAVY_MODULES)
+        result = subprocess.run([sys.executable, '-c', script], cwd=os.path.join(ROOT, path),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            return {'error': result.stderr.strip().splitlines()[-1]}
+
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(output['time'])
+        loaded = output['loaded']
+
+    return {'best': min(times), 'median': statistics.median(times), 'loaded': loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='the number of imports of each module')
+    parser.add_argument('--output', help='JSON file into which the results are saved')
+    parser.add_argument('--baseline', help='JSON file with earlier results, which are compared with the new ones')
+    parser.add_argument('modules', nargs='*', help='modules to measure (all if not given)')
+    args = parser.parse_args()
+
+    modules = args.modules or list(MODULES)
+    baseline = dict()
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    results = dict()
+    print("{:<52} {:>9} {:>9} {:>9}  {}".format('module', 'best [s]', 'median', 'baseline', 'heavy modules loaded'))
+    for module in modules:
+        result = measure(module, MODULES.get(module, '.'), args.repeat)
+        results[module] = result
+
+        if 'error' in result:
+            print("{:<52} {}".format(module, result['error']))
+            continue
+
+        previous = baseline.get(module, {}).get('best')
+        print("{:<52} {:>9.3f} {:>9.3f} {:>9}  {}".format(
+            module, result['best'], result['median'],
+            '-' if previous is None else '{:.3f}'.format(previous),
+            ', '.join(result['loaded']) or '-'))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
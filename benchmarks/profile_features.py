@@ -0,0 +1,62 @@
+"""
+Profiles the feature pipeline on a dataset (see features/profiling.py).
+
+Prints the cost of each feature function and its time per text in each token-count bucket,
+and writes the time in the folded stack format for flame graph tools, e.g.:
+    flamegraph.pl features.folded > features.svg
+
+Usage (from the root of the repository):
+    python benchmarks/profile_features.py data/weebit_train.csv --n-texts 500
+    python benchmarks/profile_features.py data/weebit_train.csv --skip parse_tree_features --no-memory
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURES_DIR = os.path.join(ROOT, 'features')
+sys.path.insert(0, FEATURES_DIR)
+
+import profiling  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data', help='CSV file with the texts in the Text column')
+    parser.add_argument('--n-texts', type=int, help='profile only a random sample of texts')
+    parser.add_argument('--chunk-size', type=int, default=64, help='the number of texts given to one call')
+    parser.add_argument('--buckets', type=int, nargs='+', default=profiling.BUCKETS,
+                        help='upper bounds of the token-count buckets')
+    parser.add_argument('--skip', nargs='*', default=[], help='names of feature functions which are not run')
+    parser.add_argument('--no-memory', action='store_true', help="don't trace the allocated memory")
+    parser.add_argument('--output', default='features.folded', help='file for the folded stacks')
+    parser.add_argument('--random-state', type=int, default=0)
+    args = parser.parse_args()
+
+    df = pd.read_csv(os.path.abspath(args.data), index_col=0)
+    if args.n_texts is not None and args.n_texts < len(df):
+        df = df.sample(args.n_texts, random_state=args.random_state)
+
+    steps = [step for step in profiling.STEPS if step.__name__ not in args.skip]
+    output = os.path.abspath(args.output)
+
+    # the feature functions read their resources relative to the features directory
+    os.chdir(FEATURES_DIR)
+    profile = profiling.profile_features(df, steps=steps, buckets=args.buckets, chunk_size=args.chunk_size,
+                                         trace_memory=not args.no_memory)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None, 'display.float_format', '{:.4g}'.format):
+        print(profile.summary())
+        print()
+        print("Time per text [ms] by number of tokens:")
+        print(profile.bucket_table())
+
+    profile.save_folded(output)
+    print()
+    print("Folded stacks written to " + output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,424 @@
+"""
+Regression gate for the features, the readability formulas and the models.
+
+A synthetic corpus is generated locally (random sentences of words from the Dale-Chall easy word list
+and made-up long words, with levels 0-4 which control the length of the sentences and the share of
+long words). The pipeline (every stage of classic_features, the formulas, non_classic_features and
+the model wrappers) is run on it and its outputs and the time of each stage are stored as a reference.
+Later runs are compared with the reference: the numerical drift of every output column and
+the speedup or slowdown of every stage are reported, and the exit code is 1 if any column drifted
+(or a stage got slower than --max-slowdown).
+
+Other implementations of the features (feature_graph, document_stats, syllable engines) can be
+checked against a reference recorded with the classic pipeline with --pipeline and --syllable-engine.
+Stages whose dependencies (e.g. benepar, keras) aren't installed are skipped and reported.
+
+Usage (from the root of the repository):
+    python benchmarks/regression_gate.py record
+    python benchmarks/regression_gate.py check
+    python benchmarks/regression_gate.py check --pipeline graph --max-slowdown 1.2
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURES_DIR = os.path.join(ROOT, 'features')
+sys.path.insert(0, FEATURES_DIR)
+sys.path.insert(0, os.path.join(ROOT, 'formulas'))
+sys.path.insert(0, os.path.join(ROOT, 'ml_models'))
+
+import classic_features as cf  # noqa: E402
+import non_classic_features as ncf  # noqa: E402
+import readability_formulas as rf  # noqa: E402
+from feature_matrix import FEATURE_COLUMNS  # noqa: E402
+
+REFERENCE_DIR = os.path.join(ROOT, 'benchmarks', 'reference')
+
+PIPELINES = ['classic', 'graph', 'document_stats']
+
+# the classic features and auxillary counts made by each pipeline
+CLASSIC_COLUMNS = ['N_words', 'N_sentences', 'N_syllables', 'N_polysyllables', 'Avg_words_per_sentence',
+                   'Avg_syllables_per_word', 'Difficult_word_percent', 'Complex_word_percent', 'Long_sent_percent',
+                   'Long_word_percent', 'Avg_letters_per_word', 'Comma_percent', 'Sent_length_std', 'Sent_length_max',
+                   'Sent_length_p50', 'Sent_length_p90', 'Long_sent_word_percent', 'Comma_sent_percent'] + \
+                  cf._sentence_length_bin_names() + list(cf.POS_RATIO)
+
+
+class StageSkipped(Exception):
+    """
+    Raised for a stage which can't run here: an optional dependency or resource is missing,
+    or a stage which makes its inputs was skipped.
+    """
+
+
+def _is_missing_dependency(error):
+    # optional packages (benepar, keras, ...), missing resource files and spacy models
+    # which aren't downloaded (spacy raises OSError E050)
+    return (isinstance(error, (ImportError, FileNotFoundError))
+            or (isinstance(error, OSError) and '[E050]' in str(error)))
+
+
+# CORPUS
+
+
+_PREFIXES = ['', '', 'inter', 'over', 'under', 'counter', 're', 'pre', 'trans', 'super']
+_ROOTS = ['nation', 'form', 'struct', 'port', 'duct', 'spect', 'dict', 'graph', 'logic', 'vers', 'mobil', 'territor']
+_SUFFIXES = ['al', 'ation', 'ive', 'ization', 'ity', 'ously', 'ional', 'ance', 'ifying', 'ist']
+_NAMES = ['Anna', 'Peter', 'London', 'Maria', 'Thomas', 'Europe', 'Alexander', 'Mississippi']
+
+
+def make_corpus(n_texts=200, random_state=0):
+    """
+    Generates the synthetic corpus.
+
+    :returns: dataframe with the columns Text and Level
+    """
+
+    random = np.random.RandomState(random_state)
+    easy_words = sorted(cf._get_dale_chall_easy_words())
+    hard_words = sorted({prefix + root + suffix for prefix in _PREFIXES for root in _ROOTS for suffix in _SUFFIXES})
+
+    texts = list()
+    levels = list()
+    for i in range(n_texts):
+        level = i % 5
+        # every 25th text is long
+        n_sentences = 40 + random.randint(40) if i % 25 == 24 else 1 + random.randint(3 + 3 * level)
+
+        sentences = list()
+        for _ in range(n_sentences):
+            n_words = max(2, random.poisson(6 + 4 * level))
+            words = list()
+            for _ in range(n_words):
+                r = random.rand()
+                if r < 0.04 + 0.06 * level:
+                    words.append(hard_words[random.randint(len(hard_words))])
+                elif r < 0.1 + 0.06 * level:
+                    words.append(_NAMES[random.randint(len(_NAMES))])
+                elif r < 0.11 + 0.06 * level:
+                    words.append(str(random.randint(1, 3000)))
+                else:
+                    words.append(easy_words[random.randint(len(easy_words))])
+
+            if n_words > 4 and random.rand() < 0.1 + 0.1 * level:
+                position = 1 + random.randint(n_words - 2)
+                words[position] += ','
+
+            sentence = ' '.join(words)
+            sentences.append(sentence[0].upper() + sentence[1:] + random.choice(['.', '.', '.', '?', '!']))
+
+        texts.append(' '.join(sentences))
+        levels.append(level)
+
+    return pd.DataFrame({'Text': texts, 'Level': levels})
+
+
+# STAGES
+
+
+def _classic_stages(syllable_engine):
+    return [
+        ('words_and_sentences', cf.words_and_sentences, ['Text']),
+        ('syllables', lambda df: cf.syllables(df, engine=syllable_engine), ['Text', 'Words', 'N_words']),
+        ('difficult_words_pct', cf.difficult_words_pct, ['Words', 'N_words']),
+        ('polysyllables', lambda df: cf.polysyllables(df, engine=syllable_engine), ['Words']),
+        ('complex_words_pct', cf.complex_words_pct, ['N_polysyllables', 'N_words']),
+        ('long_sent_pct', cf.long_sent_pct, ['Sentences', 'N_sentences']),
+        ('long_word_pct', cf.long_word_pct, ['Words', 'N_words']),
+        ('avg_letters_per_word', cf.avg_letters_per_word, ['Words', 'N_words']),
+        ('comma_pct', cf.comma_pct, ['Sentences', 'N_sentences']),
+        ('sentence_length_features', cf.sentence_length_features, ['Tokens']),
+        ('pos_features', cf.pos_features, ['Tokens']),
+    ]
+
+
+def _graph_stage(df):
+    import feature_graph as fg
+
+    return fg.compute_features(df, CLASSIC_COLUMNS)
+
+
+def _document_stats_stage(df):
+    import document_stats as ds
+
+    features = ds.extract_stats(df['Text']).features(counts=True, index=df.index)
+    for name in CLASSIC_COLUMNS:
+        df[name] = features[name]
+
+    return df
+
+
+def _dependency_stage(df):
+    # the approximations have the names of the parse-tree features, so they are renamed
+    features = ncf.dependency_parse_tree_features(df[['Text']].copy())
+    for name in ncf.PARSE_TREE_FEATURES:
+        df['Dependency_' + name] = features[name]
+
+    return df
+
+
+def _model_stages(train_fraction=0.7):
+    """
+    Stages which train each model on the first texts and predict the levels of the other texts.
+    """
+
+    def make(name, make_model):
+        model = dict()
+
+        def fit(df):
+            columns = [column for column in FEATURE_COLUMNS if column in df.columns]
+            if not columns:
+                raise StageSkipped("no feature columns (the feature stages were skipped)")
+
+            n_train = int(train_fraction * len(df))
+            fitted = make_model()
+            fitted.fit(df[columns].iloc[:n_train], df['Level'].iloc[:n_train].to_numpy())
+            model['model'] = fitted
+            return df
+
+        def predict(df):
+            if 'model' not in model:
+                raise StageSkipped(name + ".fit was skipped")
+
+            columns = [column for column in FEATURE_COLUMNS if column in df.columns]
+            n_train = int(train_fraction * len(df))
+            predictions = np.full(len(df), np.nan)
+            predictions[n_train:] = model['model'].predict(df[columns].iloc[n_train:])
+            df[name + '_prediction'] = predictions
+            return df
+
+        return [(name + '.fit', fit, ['Level']), (name + '.predict', predict, [])]
+
+    def random_forest():
+        from models.random_forest import RandomForest
+        return RandomForest(max_depth=10, n_estimators=50, random_state=0)
+
+    def xgboost():
+        from models.xgboost import XGBoost
+        return XGBoost(max_depth=6, n_estimators=50, random_state=0)
+
+    def support_vector_machine():
+        from models.support_vector_machine import SupportVectorMachine
+        return SupportVectorMachine(solver='liblinear', random_state=0)
+
+    def multilayer_perceptron():
+        from models.multilayer_perceptron import MultilayerPerceptron
+        return MultilayerPerceptron()
+
+    return (make('RandomForest', random_forest) + make('XGBoost', xgboost)
+            + make('SupportVectorMachine', support_vector_machine) + make('MultilayerPerceptron', multilayer_perceptron))
+
+
+def get_stages(pipeline='classic', syllable_engine='pyphen_text'):
+    """
+    Gets the stages of the pipeline: list of (name, function dataframe -> dataframe, the columns it needs).
+    """
+
+    if pipeline == 'classic':
+        stages = _classic_stages(syllable_engine)
+    elif pipeline == 'graph':
+        stages = [('feature_graph.compute_features', _graph_stage, ['Text'])]
+    elif pipeline == 'document_stats':
+        stages = [('document_stats', _document_stats_stage, ['Text'])]
+    else:
+        raise ValueError("Unknown pipeline: " + str(pipeline))
+
+    stages += [
+        ('flesch', rf.flesch, ['Avg_words_per_sentence', 'Avg_syllables_per_word']),
+        ('dale_chall', rf.dale_chall, ['Avg_words_per_sentence', 'Difficult_word_percent']),
+        ('gunning_fog', rf.gunning_fog, ['Avg_words_per_sentence', 'Complex_word_percent']),
+        ('parse_tree_features', ncf.parse_tree_features, ['Text']),
+        ('dependency_parse_tree_features', _dependency_stage, ['Text']),
+    ]
+
+    return stages + _model_stages()
+
+
+def run(corpus, stages, repeat=1):
+    """
+    Runs the stages on the corpus.
+
+    A stage is skipped only if it raises StageSkipped, an optional dependency or resource is missing,
+    or a column it needs is missing because an earlier stage was skipped; other errors aren't caught.
+
+    :returns: dataframe with the numeric outputs, dict stage -> the best time [s], dict stage -> reason why it was skipped
+    """
+
+    timings = dict()
+    skipped = dict()
+    for _ in range(repeat):
+        df = corpus.copy()
+        for name, stage, requires in stages:
+            if name in skipped:
+                continue
+
+            missing = [column for column in requires if column not in df.columns]
+            if missing and skipped:
+                skipped[name] = "needs " + ', '.join(missing) + " (made by skipped stages)"
+                continue
+
+            start = time.perf_counter()
+            try:
+                df = stage(df)
+            except StageSkipped as error:
+                skipped[name] = str(error)
+                continue
+            except Exception as error:
+                if not _is_missing_dependency(error):
+                    raise
+                skipped[name] = type(error).__name__ + ': ' + (str(error).splitlines() or [''])[0]
+                continue
+            elapsed = time.perf_counter() - start
+
+            timings[name] = min(elapsed, timings.get(name, np.inf))
+
+    outputs = df.drop(columns=['Text', 'Level']).select_dtypes(include=[np.number])
+    return outputs, timings, skipped
+
+
+# COMPARISON
+
+
+def compare_outputs(reference, current, atol=1e-9, rtol=1e-7):
+    """
+    Compares every output column with the reference.
+
+    :returns: dataframe with the maximal absolute and relative differences, the number of changed values
+              and the status (ok, DRIFT, MISSING or new) of each column
+    """
+
+    rows = dict()
+    for column in list(reference.columns) + [column for column in current.columns if column not in reference.columns]:
+        if column not in current.columns:
+            rows[column] = {'status': 'MISSING'}
+            continue
+        if column not in reference.columns:
+            rows[column] = {'status': 'new'}
+            continue
+
+        a = reference[column].to_numpy(dtype=np.float64)
+        b = current[column].to_numpy(dtype=np.float64)
+        changed = ~np.isclose(b, a, rtol=rtol, atol=atol, equal_nan=True)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            diff = np.abs(b - a)
+            finite = np.isfinite(diff)
+            nonzero = finite & (a != 0)
+            relative = diff[nonzero] / np.abs(a[nonzero])
+
+        rows[column] = {
+            'max_abs_diff': diff[finite].max() if finite.any() else 0.0,
+            'max_rel_diff': relative.max() if len(relative) else 0.0,
+            'n_changed': int(changed.sum()),
+            'status': 'DRIFT' if changed.any() else 'ok',
+        }
+
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['max_abs_diff', 'max_rel_diff', 'n_changed', 'status'])
+
+
+def compare_timings(reference, current, max_slowdown=None):
+    """
+    Compares the time of every stage with the reference; speedup = reference time / current time.
+    The last row (TOTAL) compares the time of the whole pipelines, which can have different stages.
+    """
+
+    stages = list(reference) + [stage for stage in current if stage not in reference]
+    totals = {'TOTAL': (sum(reference.values()), sum(current.values()))}
+
+    rows = dict()
+    for stage in stages + ['TOTAL']:
+        ref, cur = totals[stage] if stage == 'TOTAL' else (reference.get(stage, np.nan), current.get(stage, np.nan))
+        speedup = ref / cur if cur > 0 else np.nan
+
+        status = ''
+        if max_slowdown is not None and speedup < 1.0 / max_slowdown:
+            status = 'SLOWER'
+        rows[stage] = {'reference_s': ref, 'current_s': cur, 'speedup': speedup, 'status': status}
+
+    return pd.DataFrame.from_dict(rows, orient='index', columns=['reference_s', 'current_s', 'speedup', 'status'])
+
+
+# COMMAND LINE
+
+
+def record(args):
+    os.makedirs(args.reference, exist_ok=True)
+    corpus = make_corpus(args.n_texts, args.random_state)
+    outputs, timings, skipped = run(corpus, get_stages(args.pipeline, args.syllable_engine), args.repeat)
+
+    corpus.to_csv(os.path.join(args.reference, 'corpus.csv'))
+    outputs.to_csv(os.path.join(args.reference, 'outputs.csv'), float_format='%.17g')
+    with open(os.path.join(args.reference, 'timings.json'), 'w') as file:
+        json.dump({'pipeline': args.pipeline, 'syllable_engine': args.syllable_engine, 'n_texts': len(corpus),
+                   'timings': timings, 'skipped': skipped}, file, indent=2)
+
+    _print_skipped(skipped)
+    print("Reference with " + str(outputs.shape[1]) + " columns of " + str(len(corpus)) + " texts saved to " + args.reference)
+    return 0
+
+
+def check(args):
+    corpus = pd.read_csv(os.path.join(args.reference, 'corpus.csv'), index_col=0)
+    corpus['Text'] = corpus['Text'].astype(str)
+    reference_outputs = pd.read_csv(os.path.join(args.reference, 'outputs.csv'), index_col=0, float_precision='round_trip')
+    with open(os.path.join(args.reference, 'timings.json')) as file:
+        reference = json.load(file)
+
+    outputs, timings, skipped = run(corpus, get_stages(args.pipeline, args.syllable_engine), args.repeat)
+
+    drift = compare_outputs(reference_outputs, outputs, args.atol, args.rtol)
+    speed = compare_timings(reference['timings'], timings, args.max_slowdown)
+
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.float_format', '{:.4g}'.format):
+        print("Numerical drift (reference: " + reference['pipeline'] + " pipeline, current: " + args.pipeline + ")")
+        print(drift)
+        print()
+        print("Time per stage")
+        print(speed)
+
+    _print_skipped(skipped)
+
+    failed = drift['status'].isin(['DRIFT', 'MISSING']).any() or (speed['status'] == 'SLOWER').any()
+    print()
+    print("FAILED" if failed else "PASSED")
+    return 1 if failed else 0
+
+
+def _print_skipped(skipped):
+    if skipped:
+        print()
+        print("Skipped stages:")
+        for name, reason in skipped.items():
+            print("  " + name + ": " + reason)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['record', 'check'])
+    parser.add_argument('--reference', default=REFERENCE_DIR, help='directory with the reference')
+    parser.add_argument('--pipeline', choices=PIPELINES, default='classic', help='implementation of the classic features')
+    parser.add_argument('--syllable-engine', default='pyphen_text',
+                        help="syllable engine of the classic pipeline ('pyphen_text' or see syllable_engine.ENGINES)")
+    parser.add_argument('--repeat', type=int, default=1, help='the number of runs; the best time of each stage is used')
+    parser.add_argument('--n-texts', type=int, default=200, help='size of the generated corpus (record)')
+    parser.add_argument('--random-state', type=int, default=0, help='seed of the generated corpus (record)')
+    parser.add_argument('--atol', type=float, default=1e-9)
+    parser.add_argument('--rtol', type=float, default=1e-7)
+    parser.add_argument('--max-slowdown', type=float, help='fail if a stage is more than this many times slower')
+    args = parser.parse_args()
+    args.reference = os.path.abspath(args.reference)
+
+    # the feature functions read their resources relative to the features directory
+    os.chdir(FEATURES_DIR)
+
+    sys.exit(record(args) if args.command == 'record' else check(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -45,4 +45,144 @@ def bootstrap_significance_testing(y_true, y_predA, y_predB, metric, n=int(1e5))
         if di > d:
             s += 1
 
-    return s / n
\ No newline at end of file
+    return s / n
+
+
+# ALL-PAIRS COMPARISON
+
+
+# methods for the multiple comparison correction
+CORRECTIONS = ['bonferroni', 'holm', 'bh']
+
+
+def spearman(y_true, y_pred):
+    """
+    Spearman's correlation coef. of y_true and y_pred, computed along the last axis.
+    With matrices (one bootstrap sample in each row) a coef. is computed for every row,
+    so it can be used as a vectorized metric (see bootstrap_significance_matrix).
+    """
+    from scipy.stats import rankdata
+
+    a = rankdata(y_true, axis=-1)
+    b = rankdata(y_pred, axis=-1)
+    a -= a.mean(axis=-1, keepdims=True)
+    b -= b.mean(axis=-1, keepdims=True)
+
+    return (a * b).sum(axis=-1) / np.sqrt((a * a).sum(axis=-1) * (b * b).sum(axis=-1))
+
+
+def _metric_values(y_true, predictions, metric, idx, vectorized):
+    """
+    Computes the metric of every model on every bootstrap sample.
+
+    :param idx: matrix of indices, one row for each bootstrap sample
+    :returns: matrix of shape (n_models, n_samples)
+    """
+    if vectorized:
+        y_true_samples = y_true[idx]
+        return np.array([metric(y_true_samples, y_pred[idx]) for y_pred in predictions])
+
+    return np.array([[metric(y_true[i], y_pred[i]) for i in idx] for y_pred in predictions])
+
+
+def _count_exceedances(y_true, predictions, metric, d, n_draws, seed, vectorized):
+    """
+    Draws n_draws bootstrap samples and counts for every pair (A, B) how many times di > d.
+    """
+    random = np.random.RandomState(seed)
+    idx = random.randint(0, len(y_true), size=(n_draws, len(y_true)))
+
+    values = _metric_values(y_true, predictions, metric, idx, vectorized)
+    di = values[:, None, :] - values[None, :, :]
+
+    return (di > d[:, :, None]).sum(axis=2)
+
+
+def correct_p_values(p_values, method):
+    """
+    Corrects p-values for multiple comparisons.
+
+    :param p_values: array of p-values (one family of tests)
+    :param method: 'bonferroni', 'holm' (Holm-Bonferroni) or 'bh' (Benjamini-Hochberg, controls the false discovery rate)
+    :returns: array of corrected p-values, in the same order
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    m = len(p_values)
+
+    if method == 'bonferroni':
+        return np.minimum(p_values * m, 1.0)
+
+    order = np.argsort(p_values)
+    p_sorted = p_values[order]
+    if method == 'holm':
+        corrected = np.maximum.accumulate(np.minimum((m - np.arange(m)) * p_sorted, 1.0))
+    elif method == 'bh':
+        corrected = np.minimum.accumulate(np.minimum(m / np.arange(m, 0, -1) * p_sorted[::-1], 1.0))[::-1]
+    else:
+        raise ValueError("Unknown correction: " + str(method))
+
+    result = np.empty(m)
+    result[order] = corrected
+    return result
+
+
+def bootstrap_significance_matrix(y_true, predictions, metric, n=int(1e5), correction=None,
+                                  vectorized=False, block_size=1000, n_jobs=1, random_state=None):
+    """
+    Perform bootstrap significance testing for every pair of models.
+
+    The same bootstrap samples are used for all pairs: on each sample the metric is computed once
+    for every model and all pairs are compared, so the cost is that of one resampling pass
+    (N metric evaluations per sample instead of 2 for each of the N^2 pairs).
+    The samples are drawn in blocks of block_size, so the memory doesn't grow with n,
+    and the blocks can be computed in parallel processes.
+
+    The test for a pair is the same as in bootstrap_significance_testing:
+    p[a, b] is the p-value for the hypothesis that model a is better than model b.
+
+    :param y_true: true values
+    :param predictions: list of predictions of N models (or dict name -> predictions, the order of the dict is used)
+    :param metric: used metric, has to be a function of form f(y_true, y_pred)
+    :param n: integer; the number of times to perform bootstrap resampling
+    :param correction: None, or the multiple comparison correction of the N * (N - 1) p-values (see correct_p_values)
+    :param vectorized: whether metric takes matrices (one bootstrap sample in each row)
+                       and returns a value for each row, e.g. spearman
+    :param block_size: the number of bootstrap samples drawn at once
+    :param n_jobs: the number of processes which compute the blocks
+    :param random_state: seed of the bootstrap sampling; the result doesn't depend on n_jobs
+    :returns: N x N matrix of p-values; the diagonal is nan
+    """
+    if isinstance(predictions, dict):
+        predictions = list(predictions.values())
+
+    y_true = np.asarray(y_true)
+    predictions = [np.asarray(y_pred) for y_pred in predictions]
+    n_models = len(predictions)
+
+    # metric on the whole set, as a bootstrap "sample" which contains every element once
+    v = _metric_values(y_true, predictions, metric, np.arange(len(y_true))[None, :], vectorized)[:, 0]
+    d = 2 * (v[:, None] - v[None, :])
+
+    # seeds of the blocks are drawn up front, so the samples are the same for any n_jobs
+    random = np.random.RandomState(random_state)
+    block_sizes = [min(block_size, n - start) for start in range(0, n, block_size)]
+    seeds = random.randint(np.iinfo(np.int32).max, size=len(block_sizes))
+
+    if n_jobs == 1:
+        counts = [_count_exceedances(y_true, predictions, metric, d, size, seed, vectorized)
+                  for size, seed in zip(block_sizes, seeds)]
+    else:
+        from joblib import Parallel, delayed
+
+        counts = Parallel(n_jobs=n_jobs)(
+            delayed(_count_exceedances)(y_true, predictions, metric, d, size, seed, vectorized)
+            for size, seed in zip(block_sizes, seeds))
+
+    p = np.sum(counts, axis=0) / n
+
+    off_diagonal = ~np.eye(n_models, dtype=bool)
+    if correction is not None:
+        p[off_diagonal] = correct_p_values(p[off_diagonal], correction)
+    p[~off_diagonal] = np.nan
+
+    return p
@@ -0,0 +1,96 @@
+"""
+Functions for performing the statistical comparison using approximate randomization (paired permutation test).
+"""
+import numpy as np
+
+
+def _metric_values(y_true, y_pred, metric, vectorized):
+    """
+    Computes the metric for every row of y_pred (one permutation in each row).
+    """
+    if vectorized:
+        return metric(np.broadcast_to(y_true, y_pred.shape), y_pred)
+
+    return np.array([metric(y_true, row) for row in y_pred])
+
+
+def _p_value_interval(s, r, confidence):
+    """
+    Clopper-Pearson interval for the p-value, estimated from s exceedances in r permutations.
+    """
+    from scipy.stats import beta
+
+    tail = (1 - confidence) / 2
+    low = beta.ppf(tail, s, r - s + 1) if s > 0 else 0.0
+    high = beta.ppf(1 - tail, s + 1, r - s) if s < r else 1.0
+
+    return low, high
+
+
+def permutation_significance_testing(y_true, y_predA, y_predB, metric, n=int(1e4), alpha=0.05, confidence=0.99,
+                                     block_size=500, vectorized=False, random_state=None, return_n=False):
+    """
+    Perform approximate randomization (paired permutation) significance testing.
+
+    Null hypothesis is: A is no better than B on the population as a whole.
+    Alternative hypothesis: A is better than B on the population as a whole.
+
+    Under the null hypothesis the predictions of A and B for an example are exchangeable, so
+    the predictions are randomly swapped for every example and the difference of the metric
+    (A - B) is compared with the observed difference. The swaps of a block of permutations are
+    drawn as one random matrix.
+
+    The test stops early when the confidence interval of the estimated p-value is completely
+    above or below alpha, so comparisons far from the threshold need only a few blocks.
+
+    Explaination in detail (section 2.1. Approximate randomization):
+    Berg-Kirkpatrick, Taylor, David Burkett, and Dan Klein. "An empirical investigation of statistical significance in nlp."
+    Proceedings of the 2012 Joint Conference on Empirical Methods in Natural Language Processing and Computational Natural Language Learning.
+    Association for Computational Linguistics, 2012.
+
+    :param y_true:
+    :param y_predA: predictions of model A
+    :param y_predB: predictions of model B
+    :param metric: used metric, has to be a function of form f(y_true, y_pred)
+    :param n: integer; the maximal number of permutations
+    :param alpha: significance level used for early stopping; None to always use n permutations
+    :param confidence: confidence of the interval of the p-value used for early stopping
+    :param block_size: the number of permutations drawn at once
+    :param vectorized: whether metric takes matrices (one permutation in each row) and returns a value
+                       for each row, e.g. bootstrap.spearman
+    :param random_state: seed of the permutations
+    :param return_n: whether to also return the number of used permutations
+    :returns: the p-value (and the number of used permutations)
+    """
+    y_true = np.asarray(y_true)
+    y_predA = np.asarray(y_predA)
+    y_predB = np.asarray(y_predB)
+
+    d = metric(y_true, y_predA) - metric(y_true, y_predB)
+
+    random = np.random.RandomState(random_state)
+    s = 0
+    r = 0
+    while r < n:
+        size = min(block_size, n - r)
+
+        # True where the predictions of A and B are swapped
+        swap = random.randint(0, 2, size=(size, len(y_true))).astype(bool)
+        predA = np.where(swap, y_predB, y_predA)
+        predB = np.where(swap, y_predA, y_predB)
+
+        di = _metric_values(y_true, predA, metric, vectorized) - _metric_values(y_true, predB, metric, vectorized)
+        s += int(np.sum(di >= d))
+        r += size
+
+        if alpha is not None and r < n:
+            low, high = _p_value_interval(s, r, confidence)
+            if high < alpha or low > alpha:
+                break
+
+    # the observed assignment is counted as one of the permutations
+    p = (s + 1) / (r + 1)
+
+    if return_n:
+        return p, r
+    return p
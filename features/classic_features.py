@@ -5,6 +5,9 @@ All functions take a pandas dataframe as an input. The dataframe contains texts
 The functions will calculate the feature for every text in the dataframe, creating a column for the feature.
 
 To work, some functions need auxillary features; requirements for each function are written in its description.
+To compute only the wanted features with their requirements resolved automatically, use feature_graph.compute_features.
+To keep compact base statistics of the texts instead of the auxillary features, use document_stats.
+Spacy and pyphen are imported by the functions which use them, so importing this module is fast.
 
 List of classic features:
 - Avg_words_per_sentence
@@ -19,6 +22,11 @@ List of classic features:
 - Noun_percent
 - Pronoun_percent
 - Conj_percent
+- Verb_percent, Adj_percent, Adv_percent (optional, see pos_features)
+- Sent_length_std, Sent_length_max, Sent_length_p50, Sent_length_p90,
+  Long_sent_word_percent, Comma_sent_percent,
+  Sent_length_0_10, Sent_length_10_20, Sent_length_20_30, Sent_length_30_40, Sent_length_40_plus
+  (see sentence_length_features)
 
 List of Auxillary features (features used to calculate other features):
 - Tokens
@@ -30,13 +38,10 @@ List of Auxillary features (features used to calculate other features):
 - N_polysyllables
 
 """
-import pandas as pd
-
-# for tokenization
-import spacy
+from functools import lru_cache
 
-# for finding number of syllables
-import pyphen
+import numpy as np
+import pandas as pd
 
 # the following spacy model has to be downloaded
 SPACY_MODEL = "en_core_web_sm"
@@ -68,6 +73,8 @@ def words_and_sentences(df):
     :returns: the dataframe with added features
     """
     
+    import spacy
+    
     # load spacy model
     nlp = spacy.load(SPACY_MODEL, parser=False, entity=False)
     
@@ -99,12 +106,17 @@ def _count_hyphens(text, dic):
     return dic.inserted(text).count("-")
 
 
-def syllables(df):
+def syllables(df, engine='pyphen_text'):
     """
     Get total number of syllables in text for each text.
     
+    With the default engine 'pyphen_text', the number of syllables is the number of words + the number of hyphens
+    pyphen inserts into the whole text. The engines of syllable_engine.get_counter ('heuristic', 'cmudict',
+    'pyphen') count the syllables of each word, so punctuation and numbers aren't hyphenated.
+    
     Needs features:
     N_words
+    Words (only for engines other than 'pyphen_text')
     
     Adds features:
     Avg_syllables_per_word: average number of syllables per word
@@ -113,9 +125,20 @@ def syllables(df):
     N_syllables: total number of syllables in the text
     
     :param: the dataframe with the dataset
+    :param engine: 'pyphen_text' or an engine of syllable_engine.get_counter
     :returns: the dataframe with the added features
     """
     
+    if engine != 'pyphen_text':
+        import syllable_engine
+        
+        count = syllable_engine.get_counter(engine)
+        df["N_syllables"] = df["Words"].apply(lambda x: int(count(x).sum()))
+        df["Avg_syllables_per_word"] = df["N_syllables"] / df["N_words"]
+        return df
+    
+    import pyphen
+    
     # get pyphen dictionary
     dic = pyphen.Pyphen(lang='en_EN')
     
@@ -195,7 +218,7 @@ def _count_polysyllables(words, dic):
     return n_complex
 
 
-def polysyllables(df):
+def polysyllables(df, engine='pyphen_text'):
     """
     Get total number of polysyllables in text for each text.
     A polysyllable is a word with 3 or more syllables.
@@ -207,9 +230,20 @@ def polysyllables(df):
     N_polysyllables: total number of polysyllables in the text
     
     :param: the dataframe with the dataset
+    :param engine: 'pyphen_text' (the hyphens pyphen inserts into each word) or an engine of
+                   syllable_engine.get_counter (see syllables)
     :returns: the dataframe with the added feature
     """
     
+    if engine != 'pyphen_text':
+        import syllable_engine
+        
+        count = syllable_engine.get_counter(engine)
+        df["N_polysyllables"] = df["Words"].apply(lambda x: int((count(x) >= 3).sum()))
+        return df
+    
+    import pyphen
+    
     # get pyphen dictionary
     dic = pyphen.Pyphen(lang='en_EN')
     
@@ -341,12 +375,28 @@ def avg_letters_per_word(df):
 # PERCENTAGE OF SENTENCES WITH A COMA
 
 
+def _char_positions(text, char):
+    """
+    Gets the positions of all occurrences of the character in the text.
+    """
+    # one code point per element, so the positions are the same as the string indices
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype="<u4")
+    return np.flatnonzero(codes == ord(char))
+
+
 def _get_n_comma_sent(sentences):
-    n = 0
-    for sentence in sentences:
-        if str(sentence).find(",") != -1:
-            n += 1
-    return n
+    if not sentences:
+        return 0
+    
+    # find the sentence of each comma by its char offset
+    starts = np.array([sentence.start_char for sentence in sentences])
+    ends = np.array([sentence.end_char for sentence in sentences])
+    commas = _char_positions(sentences[0].doc.text, ",")
+    
+    sent_ids = np.searchsorted(starts, commas, side="right") - 1
+    inside = (sent_ids >= 0) & (commas < ends[sent_ids])
+    
+    return len(np.unique(sent_ids[inside]))
 
 
 def comma_pct(df):
@@ -369,19 +419,153 @@ def comma_pct(df):
     return df
 
 
+# SENTENCE LENGTH FEATURES
+
+
+# upper bounds of the sentence length buckets of sentence_length_features (the last bucket has no upper bound)
+SENT_LENGTH_BINS = (10, 20, 30, 40)
+
+
+def _sentence_length_bin_names(bins=SENT_LENGTH_BINS):
+    bounds = [0] + list(bins)
+    names = ["Sent_length_" + str(low) + "_" + str(high) for low, high in zip(bounds[:-1], bounds[1:])]
+    return names + ["Sent_length_" + str(bounds[-1]) + "_plus"]
+
+
+def _get_sentence_stats(tokens):
+    """
+    Gets the length and comma presence of every sentence from the token attribute arrays.
+    
+    :returns: array with the number of words in each sentence, array with True for each sentence with a comma
+    """
+    from spacy.attrs import SENT_START, IS_PUNCT, IDX
+    
+    array = tokens.to_array([SENT_START, IS_PUNCT, IDX]).astype(np.int64)
+    if len(array) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    
+    # the first token always starts a sentence
+    is_start = array[:, 0] == 1
+    is_start[0] = True
+    sent_ids = np.cumsum(is_start) - 1
+    n_sentences = sent_ids[-1] + 1
+    
+    n_words = np.bincount(sent_ids, weights=(array[:, 1] == 0), minlength=n_sentences).astype(np.int64)
+    
+    # sentence of each comma from the char offsets of the sentence starts
+    commas = _char_positions(tokens.text, ",")
+    comma_sent_ids = np.searchsorted(array[is_start, 2], commas, side="right") - 1
+    has_comma = np.bincount(comma_sent_ids[comma_sent_ids >= 0], minlength=n_sentences) > 0
+    
+    return n_words, has_comma
+
+
+def sentence_length_features(df, threshold=25, percentiles=(50, 90), bins=SENT_LENGTH_BINS):
+    """
+    Gets statistics of the sentence lengths (in words, punctuation is not counted).
+    All statistics are computed from the token attribute arrays in one pass over each text.
+    
+    Needs features:
+    Tokens
+    
+    Adds features:
+    Sent_length_std: standard deviation of the sentence length
+    Sent_length_max: length of the longest sentence
+    Sent_length_p<q>: q-th percentile of the sentence length, for each q in percentiles
+    Long_sent_word_percent: percentage of sentences with more than threshold words
+    Comma_sent_percent: percentage of sentences with a comma (same as Comma_percent)
+    Sent_length_<low>_<high>: percentage of sentences with more than low and at most high words,
+                              for the buckets given by bins (Sent_length_<last>_plus for the last one)
+    
+    :param: the dataframe with the dataset
+    :param threshold: the number of words above which a sentence is long
+    :param percentiles: the wanted percentiles of the sentence length
+    :param bins: upper bounds of the sentence length buckets
+    :returns: the dataframe with the added features
+    """
+    
+    stats = df["Tokens"].apply(_get_sentence_stats)
+    
+    for name, values in _sentence_length_columns(stats, threshold, percentiles, bins).items():
+        df[name] = values
+    
+    return df
+
+
+def _sentence_length_columns(stats, threshold=25, percentiles=(50, 90), bins=SENT_LENGTH_BINS):
+    """
+    Computes the features of sentence_length_features from the results of _get_sentence_stats.
+    
+    :returns: dict feature name -> series
+    """
+    lengths = stats.map(lambda x: x[0])
+    
+    columns = dict()
+    columns["Sent_length_std"] = lengths.map(lambda x: x.std() if len(x) else np.nan)
+    columns["Sent_length_max"] = lengths.map(lambda x: x.max() if len(x) else np.nan)
+    for q in percentiles:
+        columns["Sent_length_p" + str(q)] = lengths.map(lambda x: np.percentile(x, q) if len(x) else np.nan)
+    
+    columns["Long_sent_word_percent"] = lengths.map(lambda x: (x > threshold).mean() if len(x) else np.nan)
+    columns["Comma_sent_percent"] = stats.map(lambda x: x[1].mean() if len(x[1]) else np.nan)
+    
+    # share of sentences in each bucket, the bucket of each sentence is found with one searchsorted
+    n_bins = len(bins) + 1
+    shares = lengths.map(lambda x: np.bincount(np.searchsorted(bins, x, side="left"), minlength=n_bins) / len(x)
+                         if len(x) else np.full(n_bins, np.nan))
+    for i, name in enumerate(_sentence_length_bin_names(bins)):
+        columns[name] = shares.map(lambda x: x[i])
+    
+    return columns
+
+
 # PART OF SPEECH FEATURES
 
 
-def _get_n_pos(tokens, pos_list):
-    n = 0
-    for token in tokens:
-        for pos in pos_list:
-            if token.pos_ == pos:
-                n += 1
-    return n
+# POS features: feature name -> POS tags counted by the feature
+POS_RATIO = {
+    "Noun_percent": ["NOUN", "PROPN"],
+    "Proper_noun_percent": ["PROPN"],
+    "Pronoun_percent": ["PRON"],
+    "Conj_percent": ["CONJ", "CCONJ"],
+}
+
+# more POS features which can be given to pos_features
+MORE_POS_RATIO = {
+    "Verb_percent": ["VERB"],
+    "Adj_percent": ["ADJ"],
+    "Adv_percent": ["ADV"],
+}
+
+
+@lru_cache(maxsize=None)
+def _get_pos_ids():
+    """
+    Gets the id of each POS tag (spacy.parts_of_speech.IDS) and the number of ids.
+    """
+    from spacy.parts_of_speech import IDS
+    
+    pos_ids = {pos: int(pos_id) for pos, pos_id in IDS.items()}
+    return pos_ids, max(pos_ids.values()) + 1
+
+
+def _get_pos_counts(tokens):
+    """
+    Counts the tokens of each POS tag in one pass over the token attribute array.
+    
+    :returns: array with the count of each POS tag id, number of words, number of punctuation tokens
+    """
+    from spacy.attrs import POS, IS_PUNCT
+    
+    array = tokens.to_array([POS, IS_PUNCT]).astype(np.int64)
+    
+    pos_counts = np.bincount(array[:, 0], minlength=_get_pos_ids()[1])
+    n_punct = int(array[:, 1].sum())
+    
+    return pos_counts, len(array) - n_punct, n_punct
 
 
-def pos_features(df):
+def pos_features(df, pos_ratio=POS_RATIO):
     """
     Gets several part-of-speech features:
     1) Percentage of nouns and proper nouns.
@@ -389,9 +573,10 @@ def pos_features(df):
     3) Percentage of pronouns
     4) Percentage of conjunctions
     
+    Other POS features (e.g. MORE_POS_RATIO) can be added with pos_ratio.
+    
     Needs features:
     Tokens
-    N_words
     
     Adds features
     Noun_percent: percentage of nouns and proper nouns
@@ -400,24 +585,18 @@ def pos_features(df):
     Conj_percent: percentage of conjunctions
     
     :param: the dataframe with the dataset
+    :param pos_ratio: dict with the POS tags counted by each feature (feature name -> list of POS tags)
     :returns: the dataframe with the added feature
     """
     
-    # nouns + proper nouns percentage
-    pos_list = ["NOUN", "PROPN"]
-    df["Noun_percent"] = df["Tokens"].apply(lambda x: _get_n_pos(x, pos_list)) / df["N_words"]
-    
-    # proper nouns percentage
-    pos_list = ["PROPN"]
-    df["Proper_noun_percent"] = df["Tokens"].apply(lambda x: _get_n_pos(x, pos_list))/ df["N_words"]
-    
-    # pronouns percentage
-    pos_list = ["PRON"]
-    df["Pronoun_percent"] = df["Tokens"].apply(lambda x: _get_n_pos(x, pos_list)) / df["N_words"]
+    # count of each POS tag and number of words for every text
+    counts = df["Tokens"].apply(_get_pos_counts)
+    pos_ids, n_pos_ids = _get_pos_ids()
+    pos_counts = np.stack(counts.map(lambda x: x[0]).tolist()) if len(df) else np.zeros((0, n_pos_ids))
+    n_words = counts.map(lambda x: x[1])
     
-    # conjunctions percentage
-    pos_list = ["CONJ", "CCONJ"]
-    df["Conj_percent"] = df["Tokens"].apply(lambda x: _get_n_pos(x, pos_list)) / df["N_words"]
+    for name, pos_list in pos_ratio.items():
+        df[name] = pos_counts[:, [pos_ids[pos] for pos in pos_list]].sum(axis=1) / n_words
     
     return df
 
@@ -0,0 +1,350 @@
+"""
+Base statistics of documents, shared by the features, the formulas and the models.
+
+DocumentStats holds every base count and histogram of one text which the classic features
+and the readability formulas are computed from (number of words, syllables, difficult words,
+counts of POS tags, lengths of the sentences, ...). A batch of documents is a DocumentStatsBatch,
+which stores each statistic as one numpy array (struct of arrays), so it is small, pickles quickly
+(e.g. between worker processes) and can be saved into a .npz file.
+
+From a batch:
+- batch.features() gives the classic features (the same values as classic_features gives)
+- readability_formulas.score_stats(batch) gives the readability formulas
+- feature_matrix.feature_matrix(batch.features(), columns) gives the input of the models
+
+Example:
+    batch = extract_stats(df['Text'])
+    df = df.join(batch.features(index=df.index))
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import classic_features as cf
+
+# counts stored for each document
+COUNT_FIELDS = ['n_words', 'n_punct', 'n_syllables', 'n_difficult_words', 'n_long_words', 'n_letters']
+
+# words with MAX_SYLLABLES or more syllables are counted in the last bin of the syllable histogram
+MAX_SYLLABLES = 8
+
+# the thresholds used by the classic features
+LONG_SENTENCE_TOKENS = 25
+LONG_WORD_LETTERS = 8
+
+
+class DocumentStats():
+    """
+    Base statistics of one document.
+
+    Counts: n_words, n_punct, n_syllables, n_difficult_words, n_long_words, n_letters
+    Histograms:
+    pos_counts: the number of tokens of each POS tag id (spacy.parts_of_speech.IDS)
+    syllable_counts: the number of words with k syllables at index k (the last bin is MAX_SYLLABLES or more)
+    Sentences (one value for each sentence):
+    sentence_tokens: the number of tokens
+    sentence_words: the number of words (tokens which aren't punctuation)
+    sentence_commas: whether the sentence contains a comma
+    """
+
+    __slots__ = COUNT_FIELDS + ['pos_counts', 'syllable_counts', 'sentence_tokens', 'sentence_words', 'sentence_commas']
+
+    def __init__(self, pos_counts, syllable_counts, sentence_tokens, sentence_words, sentence_commas, **counts):
+        for name in COUNT_FIELDS:
+            setattr(self, name, int(counts[name]))
+
+        self.pos_counts = np.asarray(pos_counts, dtype=np.int32)
+        self.syllable_counts = np.asarray(syllable_counts, dtype=np.int32)
+        self.sentence_tokens = np.asarray(sentence_tokens, dtype=np.int32)
+        self.sentence_words = np.asarray(sentence_words, dtype=np.int32)
+        self.sentence_commas = np.asarray(sentence_commas, dtype=bool)
+
+
+    @property
+    def n_sentences(self):
+        return len(self.sentence_tokens)
+
+
+    @property
+    def n_polysyllables(self):
+        # words with 3 or more syllables
+        return int(self.syllable_counts[3:].sum())
+
+
+    def __repr__(self):
+        counts = ', '.join(name + '=' + str(getattr(self, name)) for name in COUNT_FIELDS)
+        return 'DocumentStats(' + counts + ', n_sentences=' + str(self.n_sentences) + ')'
+
+
+class DocumentStatsBatch():
+    """
+    Base statistics of a batch of documents, stored as a struct of arrays.
+
+    Each count of DocumentStats is an array with one value per document, the histograms are matrices
+    with one row per document and the sentence values of all documents are concatenated into one array;
+    the sentences of document i are sentence_offsets[i]:sentence_offsets[i + 1].
+
+    batch[i] gives the DocumentStats of document i and batch[name] the array of the statistic name
+    (also n_sentences and n_polysyllables), so the batch can be used wherever arrays of counts are expected.
+    """
+
+    def __init__(self, counts, pos_counts, syllable_counts, sentence_offsets, sentence_tokens, sentence_words, sentence_commas):
+        """
+        :param counts: dict with an array for each name in COUNT_FIELDS
+        """
+        self.counts = {name: np.asarray(counts[name], dtype=np.int32) for name in COUNT_FIELDS}
+        self.pos_counts = np.asarray(pos_counts, dtype=np.int32)
+        self.syllable_counts = np.asarray(syllable_counts, dtype=np.int32)
+        self.sentence_offsets = np.asarray(sentence_offsets, dtype=np.int64)
+        self.sentence_tokens = np.asarray(sentence_tokens, dtype=np.int32)
+        self.sentence_words = np.asarray(sentence_words, dtype=np.int32)
+        self.sentence_commas = np.asarray(sentence_commas, dtype=bool)
+
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Makes a batch from a list of DocumentStats.
+        """
+
+        records = list(records)
+        n_pos_ids = cf._get_pos_ids()[1] if not records else len(records[0].pos_counts)
+
+        counts = {name: [getattr(record, name) for record in records] for name in COUNT_FIELDS}
+        pos_counts = np.zeros((len(records), n_pos_ids), dtype=np.int32)
+        syllable_counts = np.zeros((len(records), MAX_SYLLABLES + 1), dtype=np.int32)
+        for i, record in enumerate(records):
+            pos_counts[i] = record.pos_counts
+            syllable_counts[i] = record.syllable_counts
+
+        sentence_offsets = np.concatenate([[0], np.cumsum([record.n_sentences for record in records], dtype=np.int64)])
+
+        def concatenate(name, dtype):
+            return np.concatenate([getattr(record, name) for record in records] + [np.zeros(0, dtype=dtype)])
+
+        return cls(counts, pos_counts, syllable_counts, sentence_offsets, concatenate('sentence_tokens', np.int32),
+                   concatenate('sentence_words', np.int32), concatenate('sentence_commas', bool))
+
+
+    @classmethod
+    def concatenate(cls, batches):
+        """
+        Puts batches (e.g. the results of worker processes) together, in the given order.
+        """
+
+        batches = list(batches)
+        if not batches:
+            return cls.from_records([])
+
+        offsets = [batches[0].sentence_offsets[:1]]
+        end = 0
+        for batch in batches:
+            offsets.append(batch.sentence_offsets[1:] + end)
+            end += batch.sentence_offsets[-1]
+
+        return cls({name: np.concatenate([batch.counts[name] for batch in batches]) for name in COUNT_FIELDS},
+                   np.concatenate([batch.pos_counts for batch in batches]),
+                   np.concatenate([batch.syllable_counts for batch in batches]),
+                   np.concatenate(offsets),
+                   np.concatenate([batch.sentence_tokens for batch in batches]),
+                   np.concatenate([batch.sentence_words for batch in batches]),
+                   np.concatenate([batch.sentence_commas for batch in batches]))
+
+
+    def __len__(self):
+        return len(self.sentence_offsets) - 1
+
+
+    @property
+    def n_sentences(self):
+        return np.diff(self.sentence_offsets)
+
+
+    @property
+    def n_polysyllables(self):
+        return self.syllable_counts[:, 3:].sum(axis=1)
+
+
+    def _sentence_sums(self, values):
+        """
+        Sums the sentence values of each document.
+        """
+        document_ids = np.repeat(np.arange(len(self)), self.n_sentences)
+        return np.bincount(document_ids, weights=values, minlength=len(self)).astype(np.int64)
+
+
+    @property
+    def n_long_sentences(self):
+        return self._sentence_sums(self.sentence_tokens > LONG_SENTENCE_TOKENS)
+
+
+    @property
+    def n_comma_sentences(self):
+        return self._sentence_sums(self.sentence_commas)
+
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key in self.counts:
+                return self.counts[key]
+            return getattr(self, key)
+
+        start, end = self.sentence_offsets[key], self.sentence_offsets[key + 1]
+        return DocumentStats(self.pos_counts[key], self.syllable_counts[key], self.sentence_tokens[start:end],
+                             self.sentence_words[start:end], self.sentence_commas[start:end],
+                             **{name: self.counts[name][key] for name in COUNT_FIELDS})
+
+
+    def features(self, pos_ratio=cf.POS_RATIO, sentence_length=True, counts=False, index=None):
+        """
+        Computes the classic features of the documents.
+
+        :param pos_ratio: the POS features (see classic_features.pos_features)
+        :param sentence_length: whether to add the features of classic_features.sentence_length_features
+        :param counts: whether to add the auxillary counts N_words, N_sentences, N_syllables and N_polysyllables
+        :param index: index of the returned dataframe
+        :returns: dataframe with a column for each feature
+        """
+
+        n_words = self.counts['n_words']
+        n_sentences = self.n_sentences
+
+        columns = dict()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            columns['Avg_words_per_sentence'] = n_words / n_sentences
+            columns['Avg_syllables_per_word'] = self.counts['n_syllables'] / n_words
+            columns['Difficult_word_percent'] = self.counts['n_difficult_words'] / n_words
+            columns['Complex_word_percent'] = self.n_polysyllables / n_words
+            columns['Long_sent_percent'] = self.n_long_sentences / n_sentences
+            columns['Long_word_percent'] = self.counts['n_long_words'] / n_words
+            columns['Avg_letters_per_word'] = self.counts['n_letters'] / n_words
+            columns['Comma_percent'] = self.n_comma_sentences / n_sentences
+
+            pos_ids = cf._get_pos_ids()[0]
+            for name, pos_list in pos_ratio.items():
+                columns[name] = self.pos_counts[:, [pos_ids[pos] for pos in pos_list]].sum(axis=1) / n_words
+
+        df = pd.DataFrame(columns, index=index)
+
+        if sentence_length:
+            stats = pd.Series([(self.sentence_words[start:end], self.sentence_commas[start:end])
+                               for start, end in zip(self.sentence_offsets[:-1], self.sentence_offsets[1:])],
+                              index=df.index, dtype=object)
+            for name, values in cf._sentence_length_columns(stats).items():
+                df[name] = values
+
+        if counts:
+            df['N_words'] = n_words
+            df['N_sentences'] = n_sentences
+            df['N_syllables'] = self.counts['n_syllables']
+            df['N_polysyllables'] = self.n_polysyllables
+
+        return df
+
+
+    def save(self, path):
+        """
+        Saves the batch into a .npz file.
+        """
+
+        np.savez(path, pos_counts=self.pos_counts, syllable_counts=self.syllable_counts,
+                 sentence_offsets=self.sentence_offsets, sentence_tokens=self.sentence_tokens,
+                 sentence_words=self.sentence_words, sentence_commas=self.sentence_commas, **self.counts)
+
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls({name: arrays[name] for name in COUNT_FIELDS}, arrays['pos_counts'], arrays['syllable_counts'],
+                       arrays['sentence_offsets'], arrays['sentence_tokens'], arrays['sentence_words'],
+                       arrays['sentence_commas'])
+
+
+# EXTRACTION
+
+
+@lru_cache(maxsize=None)
+def _get_nlp():
+    import spacy
+
+    return spacy.load(cf.SPACY_MODEL, disable=['ner'])
+
+
+@lru_cache(maxsize=None)
+def _get_pyphen():
+    import pyphen
+
+    return pyphen.Pyphen(lang='en_EN')
+
+
+@lru_cache(maxsize=None)
+def _get_easy_words():
+    return frozenset(cf._get_dale_chall_easy_words())
+
+
+def get_document_stats(tokens):
+    """
+    Computes the statistics of a text parsed by spacy (the same definitions as in classic_features).
+
+    :param tokens: spacy Doc
+    :returns: DocumentStats
+    """
+    from spacy.attrs import POS, IS_PUNCT, SENT_START, IDX
+
+    dic = _get_pyphen()
+    easy_words = _get_easy_words()
+    words = cf._get_words(tokens)
+
+    array = tokens.to_array([POS, IS_PUNCT, SENT_START, IDX]).astype(np.int64)
+    n_punct = int(array[:, 1].sum())
+
+    # sentences from the sentence starts (the first token always starts a sentence)
+    if len(array):
+        is_start = array[:, 2] == 1
+        is_start[0] = True
+        sent_ids = np.cumsum(is_start) - 1
+        n_sentences = sent_ids[-1] + 1
+
+        sentence_tokens = np.bincount(sent_ids, minlength=n_sentences)
+        sentence_words = np.bincount(sent_ids, weights=(array[:, 1] == 0), minlength=n_sentences)
+
+        commas = cf._char_positions(tokens.text, ",")
+        comma_sent_ids = np.searchsorted(array[is_start, 3], commas, side="right") - 1
+        sentence_commas = np.bincount(comma_sent_ids[comma_sent_ids >= 0], minlength=n_sentences) > 0
+    else:
+        sentence_tokens = sentence_words = sentence_commas = np.zeros(0)
+
+    # number of syllables of a word is number of its hyphens + 1
+    n_syllables = np.array([dic.inserted(word).count("-") + 1 for word in words], dtype=np.int64)
+    syllable_counts = np.bincount(np.minimum(n_syllables, MAX_SYLLABLES), minlength=MAX_SYLLABLES + 1)
+    word_lengths = np.array([len(word) for word in words], dtype=np.int64)
+
+    return DocumentStats(
+        pos_counts=np.bincount(array[:, 0], minlength=cf._get_pos_ids()[1]),
+        syllable_counts=syllable_counts,
+        sentence_tokens=sentence_tokens,
+        sentence_words=sentence_words,
+        sentence_commas=sentence_commas,
+        n_words=len(words),
+        n_punct=n_punct,
+        # as in classic_features.syllables, the hyphens are counted in the whole text
+        n_syllables=len(words) + cf._count_hyphens(tokens.text, dic),
+        n_difficult_words=sum(1 for word in words if word.lower() not in easy_words),
+        n_long_words=int((word_lengths > LONG_WORD_LETTERS).sum()),
+        n_letters=int(word_lengths.sum()),
+    )
+
+
+def extract_stats(texts, batch_size=256):
+    """
+    Parses the texts with spacy and computes their statistics. Only the statistics
+    (not the parsed documents) are kept, so the texts can be a stream of any length.
+
+    :param texts: iterable of strings
+    :param batch_size: the number of texts spacy processes at once
+    :returns: DocumentStatsBatch
+    """
+
+    nlp = _get_nlp()
+    return DocumentStatsBatch.from_records(get_document_stats(doc) for doc in nlp.pipe((str(text) for text in texts), batch_size=batch_size))
@@ -0,0 +1,143 @@
+"""
+Multi-core feature extraction.
+
+FeatureExtractor computes any set of features (see feature_graph) for the texts of a dataframe
+in a pool of worker processes. The texts are split into chunks of consecutive rows and the results
+are put together in the order of the chunks, so the output doesn't depend on the number of workers
+and is the same as the output of feature_graph.compute_features.
+
+Each worker loads the spacy pipelines, the pyphen dictionary and benepar (only the ones needed by
+the features) once, when it starts. The number of threads of BLAS libraries and Torch in each worker
+is limited, so the workers don't oversubscribe the cores, and each worker can be pinned to its own cores.
+
+Example:
+    extractor = FeatureExtractor(['Avg_words_per_sentence', 'NP_per_sent'], n_workers=16)
+    df = extractor.transform(df)
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import pandas as pd
+
+import feature_graph as fg
+
+# environment variables which limit the number of threads of numerical libraries
+THREAD_ENV_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                        'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS']
+
+
+def _preload(order):
+    """
+    Loads the models needed for the features (in the order made by feature_graph.plan).
+    """
+    if 'Word_tokens' in order:
+        fg._get_tokenizer()
+    # the tagger and the parser are loaded only for the features which need them
+    if 'Tokens' in order:
+        fg._get_nlp(disable=('ner',))
+    if 'N_syllables' in order or 'N_polysyllables' in order:
+        fg._get_pyphen()
+    if 'Parse_tree_stats' in order:
+        fg._get_benepar_nlp()
+
+
+def _init_worker(features, threads_per_worker, pin_cpus, counter):
+    if pin_cpus and hasattr(os, 'sched_setaffinity'):
+        # the workers get consecutive blocks of the available cores, in the order in which they start
+        with counter.get_lock():
+            worker_id = counter.value
+            counter.value += 1
+
+        cpus = sorted(os.sched_getaffinity(0))
+        start = worker_id * threads_per_worker
+        os.sched_setaffinity(0, {cpus[(start + i) % len(cpus)] for i in range(threads_per_worker)})
+
+    order = fg.plan(features)
+    if 'Parse_tree_stats' in order:
+        import torch
+
+        torch.set_num_threads(threads_per_worker)
+
+    _preload(order)
+
+
+def _extract_chunk(texts, features):
+    return fg.compute_features(pd.DataFrame({fg.TEXT: texts}), features)[features]
+
+
+class FeatureExtractor():
+    """
+    Class for computing features in parallel worker processes.
+    """
+
+    def __init__(self, features, n_workers=None, chunk_size=256, threads_per_worker=1, pin_cpus=False, start_method='spawn'):
+        """
+        :param features: names of the wanted features (see feature_graph.FEATURES)
+        :param n_workers: the number of worker processes; the number of available cores if not given
+        :param chunk_size: the number of texts sent to a worker at once
+        :param threads_per_worker: the number of threads of BLAS libraries and Torch in each worker
+        :param pin_cpus: whether each worker is pinned to its own threads_per_worker cores (Linux only)
+        :param start_method: start method of the worker processes ('spawn', 'forkserver' or 'fork')
+        """
+        self.features = list(features)
+        self.n_workers = n_workers if n_workers is not None else len(_available_cpus())
+        self.chunk_size = chunk_size
+        self.threads_per_worker = threads_per_worker
+        self.pin_cpus = pin_cpus
+        self.start_method = start_method
+
+        # check the features before starting the workers
+        fg.plan(self.features)
+
+
+    def transform(self, df):
+        """
+        Computes the features for each text in the dataframe.
+
+        :param df: the dataframe with the dataset
+        :returns: the dataframe with the added features
+        """
+
+        if self.n_workers == 1:
+            return fg.compute_features(df, self.features)
+
+        texts = df[fg.TEXT].tolist()
+        chunks = [texts[start:start + self.chunk_size] for start in range(0, len(texts), self.chunk_size)]
+
+        context = multiprocessing.get_context(self.start_method)
+        counter = context.Value('i', 0)
+
+        # the limits are set in the environment before the workers start, so the libraries read them when loaded
+        saved = {name: os.environ.get(name) for name in THREAD_ENV_VARIABLES}
+        try:
+            for name in THREAD_ENV_VARIABLES:
+                os.environ[name] = str(self.threads_per_worker)
+
+            with ProcessPoolExecutor(max_workers=self.n_workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(self.features, self.threads_per_worker, self.pin_cpus, counter)) as executor:
+                # map keeps the order of the chunks
+                results = list(executor.map(_extract_chunk, chunks, [self.features] * len(chunks)))
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        if results:
+            values = pd.concat(results, ignore_index=True)
+        else:
+            values = pd.DataFrame(columns=self.features)
+        values.index = df.index
+
+        for name in self.features:
+            df[name] = values[name]
+
+        return df
+
+
+def _available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return os.sched_getaffinity(0)
+    return range(os.cpu_count() or 1)
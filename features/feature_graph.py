@@ -0,0 +1,365 @@
+"""
+Declarative registry of the readability features and a scheduler which computes them.
+
+Every feature (or auxillary feature) is registered together with the features it needs.
+For a requested set of features, compute_features finds the minimal set of features
+which have to be computed, computes each of them once (shared by all features which need it),
+runs independent features in parallel and frees auxillary features as soon as
+no remaining feature needs them.
+
+Words are found with the spacy tokenizer only, so features which need just the words
+(e.g. Long_word_percent) don't run the tagger and the parser.
+Only features which need sentences or parts of speech run the full spacy pipeline.
+
+Example:
+    df = compute_features(df, ['Long_word_percent', 'Avg_words_per_sentence'], n_jobs=2)
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
+from operator import itemgetter
+
+import pandas as pd
+
+import classic_features as cf
+
+# the input column of the dataframe
+TEXT = 'Text'
+
+
+class Feature():
+    """
+    A registered feature: its name, the features it needs and the function which computes it.
+    The function gets the needed features (pandas series) as arguments, in the order of inputs,
+    and returns the series with the feature.
+    """
+
+    def __init__(self, name, inputs, function):
+        self.name = name
+        self.inputs = list(inputs)
+        self.function = function
+
+
+    def arguments(self, values):
+        return [values[name] for name in self.inputs]
+
+
+# all registered features
+FEATURES = dict()
+
+
+def feature(name, inputs):
+    """
+    Decorator which registers a function computing the feature name from the features in inputs.
+    """
+
+    def register(function):
+        if name in FEATURES:
+            raise ValueError("Feature already registered: " + name)
+        FEATURES[name] = Feature(name, inputs, function)
+        return function
+
+    return register
+
+
+@lru_cache(maxsize=None)
+def _get_nlp(disable=()):
+    import spacy
+
+    return spacy.load(cf.SPACY_MODEL, disable=list(disable))
+
+
+@lru_cache(maxsize=None)
+def _get_tokenizer():
+    # the English tokenizer of a blank pipeline, the model isn't loaded
+    import spacy
+
+    return spacy.blank('en').tokenizer
+
+
+@lru_cache(maxsize=None)
+def _get_pyphen():
+    import pyphen
+
+    return pyphen.Pyphen(lang='en_EN')
+
+
+# DOCUMENTS
+
+
+@feature('Word_tokens', inputs=[TEXT])
+def _word_tokens(texts):
+    # tokenizer only; the tokens are the same as the ones of the full pipeline
+    tokenizer = _get_tokenizer()
+    return pd.Series([tokenizer(text) for text in texts], index=texts.index)
+
+
+@feature('Tokens', inputs=[TEXT])
+def _tokens(texts):
+    nlp = _get_nlp(disable=('ner',))
+    return pd.Series(list(nlp.pipe(texts)), index=texts.index)
+
+
+# WORDS AND SENTENCES
+
+
+@feature('Words', inputs=['Word_tokens'])
+def _words(word_tokens):
+    return word_tokens.apply(cf._get_words)
+
+
+@feature('Sentences', inputs=['Tokens'])
+def _sentences(tokens):
+    return tokens.apply(lambda x: list(x.sents))
+
+
+@feature('N_words', inputs=['Words'])
+def _n_words(words):
+    return words.apply(len)
+
+
+@feature('N_sentences', inputs=['Sentences'])
+def _n_sentences(sentences):
+    return sentences.apply(len)
+
+
+@feature('Avg_words_per_sentence', inputs=['N_words', 'N_sentences'])
+def _avg_words_per_sentence(n_words, n_sentences):
+    return n_words / n_sentences
+
+
+# SYLLABLES
+
+
+@feature('N_syllables', inputs=[TEXT, 'N_words'])
+def _n_syllables(texts, n_words):
+    dic = _get_pyphen()
+    return n_words + texts.apply(lambda x: cf._count_hyphens(x, dic))
+
+
+@feature('Avg_syllables_per_word', inputs=['N_syllables', 'N_words'])
+def _avg_syllables_per_word(n_syllables, n_words):
+    return n_syllables / n_words
+
+
+@feature('N_polysyllables', inputs=['Words'])
+def _n_polysyllables(words):
+    dic = _get_pyphen()
+    return words.apply(lambda x: cf._count_polysyllables(x, dic))
+
+
+@feature('Complex_word_percent', inputs=['N_polysyllables', 'N_words'])
+def _complex_word_percent(n_polysyllables, n_words):
+    return n_polysyllables / n_words
+
+
+# WORD FEATURES
+
+
+@feature('Difficult_word_percent', inputs=['Words', 'N_words'])
+def _difficult_word_percent(words, n_words):
+    easy_words = cf._get_dale_chall_easy_words()
+    return words.apply(lambda x: cf._get_num_difficult_words(x, easy_words)) / n_words
+
+
+@feature('Long_word_percent', inputs=['Words', 'N_words'])
+def _long_word_percent(words, n_words):
+    return words.apply(cf._get_n_long_word) / n_words
+
+
+@feature('Avg_letters_per_word', inputs=['Words', 'N_words'])
+def _avg_letters_per_word(words, n_words):
+    return words.apply(cf._get_n_letters) / n_words
+
+
+# SENTENCE FEATURES
+
+
+@feature('Long_sent_percent', inputs=['Sentences', 'N_sentences'])
+def _long_sent_percent(sentences, n_sentences):
+    return sentences.apply(cf._get_n_long_sent) / n_sentences
+
+
+@feature('Comma_percent', inputs=['Sentences', 'N_sentences'])
+def _comma_percent(sentences, n_sentences):
+    return sentences.apply(cf._get_n_comma_sent) / n_sentences
+
+
+# SENTENCE LENGTH FEATURES (default threshold and percentiles of sentence_length_features)
+
+
+SENTENCE_LENGTH_FEATURES = ['Sent_length_std', 'Sent_length_max', 'Sent_length_p50', 'Sent_length_p90',
+                            'Long_sent_word_percent', 'Comma_sent_percent'] + cf._sentence_length_bin_names()
+
+
+@feature('Sentence_length_columns', inputs=['Tokens'])
+def _sentence_length_columns(tokens):
+    return pd.DataFrame(cf._sentence_length_columns(tokens.apply(cf._get_sentence_stats)))
+
+
+def _register_sentence_length_feature(name):
+    @feature(name, inputs=['Sentence_length_columns'])
+    def _sentence_length_feature(columns):
+        return columns[name]
+
+
+for name in SENTENCE_LENGTH_FEATURES:
+    _register_sentence_length_feature(name)
+
+
+# PART OF SPEECH FEATURES
+
+
+@feature('Pos_counts', inputs=['Tokens'])
+def _pos_counts(tokens):
+    return tokens.apply(cf._get_pos_counts)
+
+
+def _register_pos_feature(name, pos_list):
+    @feature(name, inputs=['Pos_counts'])
+    def _pos_percent(pos_counts):
+        pos_ids = [cf._get_pos_ids()[0][pos] for pos in pos_list]
+        return pos_counts.map(lambda x: x[0][pos_ids].sum()) / pos_counts.map(lambda x: x[1])
+
+
+for name, pos_list in {**cf.POS_RATIO, **cf.MORE_POS_RATIO}.items():
+    _register_pos_feature(name, pos_list)
+
+
+# DOCUMENT STATISTICS
+
+
+@feature('Document_stats', inputs=['Tokens'])
+def _document_stats(tokens):
+    # DocumentStats of each text; DocumentStatsBatch.from_records(values) makes a batch
+    import document_stats as ds
+
+    return tokens.apply(ds.get_document_stats)
+
+
+# PARSE-TREE FEATURES
+
+
+# the features returned by non_classic_features._get_parse_tree_features, in order
+PARSE_TREE_FEATURES = ['NP_per_sent', 'VP_per_sent', 'PP_per_sent', 'SBAR_per_sent', 'SBARQ_per_sent',
+                       'avg_NP_size', 'avg_VP_size', 'avg_PP_size', 'avg_parse_tree']
+
+
+@lru_cache(maxsize=None)
+def _get_benepar_nlp():
+    import spacy
+    from benepar.spacy_plugin import BeneparComponent
+    import non_classic_features as ncf
+
+    nlp = spacy.load(ncf.SPACY_MODEL, disable=['ner'])
+    nlp.add_pipe(BeneparComponent(ncf.BENEPAR_MODEL))
+    return nlp
+
+
+@feature('Parse_tree_stats', inputs=[TEXT])
+def _parse_tree_stats(texts):
+    import non_classic_features as ncf
+
+    nlp = _get_benepar_nlp()
+    return pd.Series([ncf._get_parse_tree_features(doc) for doc in nlp.pipe(texts)], index=texts.index)
+
+
+def _register_parse_tree_feature(name, i):
+    @feature(name, inputs=['Parse_tree_stats'])
+    def _parse_tree_feature(stats):
+        return stats.map(itemgetter(i))
+
+
+for i, name in enumerate(PARSE_TREE_FEATURES):
+    _register_parse_tree_feature(name, i)
+
+
+# SCHEDULER
+
+
+def plan(features):
+    """
+    Finds the minimal set of features needed for the wanted features.
+
+    :param features: names of the wanted features
+    :returns: list of the features to compute, in an order in which every feature comes after the features it needs
+    """
+
+    order = list()
+    visiting = set()
+
+    def visit(name):
+        if name == TEXT or name in order:
+            return
+        if name not in FEATURES:
+            raise ValueError("Unknown feature: " + str(name))
+        if name in visiting:
+            raise ValueError("Cyclic feature dependency: " + name)
+
+        visiting.add(name)
+        for input_name in FEATURES[name].inputs:
+            visit(input_name)
+        visiting.remove(name)
+        order.append(name)
+
+    for name in features:
+        visit(name)
+
+    return order
+
+
+def compute_features(df, features, n_jobs=1):
+    """
+    Computes the wanted features for each text in the dataframe.
+
+    Every needed auxillary feature is computed once and freed when no remaining feature needs it;
+    only the wanted features are added to the dataframe.
+
+    :param df: the dataframe with the dataset
+    :param features: names of the wanted features
+    :param n_jobs: the number of features which can be computed at the same time (in threads)
+    :returns: the dataframe with the added features
+    """
+
+    order = plan(features)
+    wanted = set(features)
+
+    # number of features which still need each feature
+    n_consumers = dict()
+    for name in order:
+        for input_name in FEATURES[name].inputs:
+            n_consumers[input_name] = n_consumers.get(input_name, 0) + 1
+
+    values = {TEXT: df[TEXT]}
+
+    def release(name):
+        for input_name in FEATURES[name].inputs:
+            n_consumers[input_name] -= 1
+            if n_consumers[input_name] == 0 and input_name not in wanted and input_name != TEXT:
+                del values[input_name]
+
+    if n_jobs == 1:
+        for name in order:
+            values[name] = FEATURES[name].function(*FEATURES[name].arguments(values))
+            release(name)
+    else:
+        waiting = list(order)
+        running = dict()
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            while waiting or running:
+                # start every feature whose inputs are computed
+                ready = [name for name in waiting
+                         if all(input_name in values for input_name in FEATURES[name].inputs)]
+                for name in ready:
+                    waiting.remove(name)
+                    running[executor.submit(FEATURES[name].function, *FEATURES[name].arguments(values))] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    values[name] = future.result()
+                    release(name)
+
+    for name in features:
+        df[name] = values[name]
+
+    return df
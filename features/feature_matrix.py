@@ -0,0 +1,164 @@
+"""
+Compact feature matrices for the models.
+
+The features created by classic_features and non_classic_features are pandas columns of float64
+(and int64 for the auxillary counts). This module converts them into:
+- a C-contiguous float32 matrix with the columns in the fixed order FEATURE_COLUMNS
+- optionally 8-bit or 16-bit quantized features (QuantizedFeatures), with a scale and an offset for each column
+- the smallest unsigned integer dtype for the count columns (downcast_counts)
+
+The models (ml_models) accept the float32 matrix and QuantizedFeatures directly.
+"""
+import numpy as np
+
+# the features used by the models, in the order of the columns of the feature tables
+# (the order in which the features are created in feature_analysis.ipynb)
+FEATURE_COLUMNS = [
+    # classic features
+    'Avg_words_per_sentence',
+    'Avg_syllables_per_word',
+    'Difficult_word_percent',
+    'Complex_word_percent',
+    'Long_sent_percent',
+    'Long_word_percent',
+    'Avg_letters_per_word',
+    'Comma_percent',
+    'Noun_percent',
+    'Proper_noun_percent',
+    'Pronoun_percent',
+    'Conj_percent',
+    # non-classic features
+    'NP_per_sent',
+    'VP_per_sent',
+    'PP_per_sent',
+    'SBAR_per_sent',
+    'SBARQ_per_sent',
+    'avg_NP_size',
+    'avg_VP_size',
+    'avg_PP_size',
+    'avg_parse_tree',
+]
+
+# auxillary count features
+COUNT_COLUMNS = ['N_words', 'N_sentences', 'N_syllables', 'N_polysyllables']
+
+QUANTIZATION_DTYPES = {8: np.uint8, 16: np.uint16}
+
+
+def feature_matrix(df, columns=FEATURE_COLUMNS, dtype=np.float32):
+    """
+    Gets the features as a C-contiguous matrix.
+
+    :param df: the dataframe with the features
+    :param columns: the feature columns, in the wanted order
+    :param dtype: dtype of the matrix
+    :returns: numpy array of shape (n_texts, len(columns))
+    """
+
+    return np.ascontiguousarray(df[list(columns)].to_numpy(dtype=dtype))
+
+
+def downcast_counts(df, columns=COUNT_COLUMNS):
+    """
+    Converts the count columns to the smallest unsigned integer dtype which holds their values.
+    The conversion is done in place; columns which aren't in the dataframe are skipped.
+    """
+
+    for column in columns:
+        if column in df.columns and len(df):
+            df[column] = df[column].astype(np.min_scalar_type(int(df[column].max())))
+
+    return df
+
+
+class QuantizedFeatures():
+    """
+    Class for features quantized to 8-bit or 16-bit unsigned integers.
+
+    Each column is quantized linearly: value = offset + scale * code. The codes, scales and offsets
+    are stored, so the features take 4 (8-bit) or 2 (16-bit) times less memory than float32.
+    np.asarray(features) gives the dequantized float32 matrix; the models accept the object directly.
+    """
+
+    def __init__(self, codes, scale, offset, columns=None):
+        self.codes = np.ascontiguousarray(codes)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.offset = np.asarray(offset, dtype=np.float32)
+        self.columns = None if columns is None else list(columns)
+
+
+    @classmethod
+    def quantize(cls, X, bits=8, columns=None):
+        """
+        Quantizes the features.
+
+        :param X: dataframe or matrix with the features; nan values aren't supported
+        :param bits: 8 or 16
+        :param columns: names of the columns; taken from the dataframe if not given
+        """
+
+        if bits not in QUANTIZATION_DTYPES:
+            raise ValueError("Unsupported number of bits: " + str(bits))
+        if columns is None and hasattr(X, 'columns'):
+            columns = list(X.columns)
+
+        X = np.asarray(X, dtype=np.float64)
+        levels = 2 ** bits - 1
+
+        offset = X.min(axis=0)
+        scale = (X.max(axis=0) - offset) / levels
+        # constant columns
+        scale[scale == 0.0] = 1.0
+
+        codes = np.rint((X - offset) / scale).astype(QUANTIZATION_DTYPES[bits])
+
+        return cls(codes, scale, offset, columns)
+
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+
+    def __len__(self):
+        return len(self.codes)
+
+
+    def __getitem__(self, columns):
+        """
+        Selects columns by name (as in a dataframe); used by the models to reorder the features.
+        """
+
+        idx = [self.columns.index(column) for column in columns]
+        return QuantizedFeatures(self.codes[:, idx], self.scale[idx], self.offset[idx], columns)
+
+
+    def dequantize(self, dtype=np.float32):
+        X = self.codes.astype(dtype)
+        X *= self.scale
+        X += self.offset
+        return X
+
+
+    def __array__(self, dtype=None, copy=None):
+        X = self.dequantize()
+        return X if dtype is None else X.astype(dtype, copy=False)
+
+
+    def save(self, path):
+        """
+        Saves the features into a .npz file.
+        """
+
+        arrays = {'codes': self.codes, 'scale': self.scale, 'offset': self.offset}
+        if self.columns is not None:
+            arrays['columns'] = np.array(self.columns)
+
+        np.savez(path, **arrays)
+
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            columns = [str(column) for column in arrays['columns']] if 'columns' in arrays.files else None
+            return cls(arrays['codes'], arrays['scale'], arrays['offset'], columns)
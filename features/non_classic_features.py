@@ -21,13 +21,19 @@ List of non-classic features:
 List of Auxillary features (features used to calculate other features):
 - Tokens
 
+Faster approximations of the parse-tree features from the dependency parse: dependency_parse_tree_features
+(compare with benepar using calibration_report).
+
+Parsed sentences can be cached across texts (and saved to disk) with ParseCache.
+
 """
-from collections import Counter, defaultdict
-import pandas as pd
-import spacy
+from collections import Counter, OrderedDict, defaultdict
+import hashlib
+import json
+import os
 
-# benepar dependency
-from benepar.spacy_plugin import BeneparComponent
+import numpy as np
+import pandas as pd
 
 # the following spacy model has to be downloaded
 SPACY_MODEL = "en_core_web_sm"
@@ -36,6 +42,33 @@ SPACY_MODEL = "en_core_web_sm"
 BENEPAR_MODEL = "benepar_en_small"
 
 
+def _load_nlp():
+    import spacy
+    
+    return spacy.load(SPACY_MODEL, disable=['ner'])
+
+
+def _load_sentencizer(max_length=None):
+    # rule-based sentence splitting without the tagger and the parser, so its cost is small even for long texts
+    import spacy
+    
+    # the tokenizer of the blank English pipeline is the same as the one of SPACY_MODEL
+    nlp = spacy.blank('en')
+    nlp.add_pipe(nlp.create_pipe('sentencizer'))
+    if max_length is not None:
+        nlp.max_length = max(nlp.max_length, max_length)
+    return nlp
+
+
+def _load_benepar_nlp():
+    # benepar dependency; only needed for the benepar parse-tree features
+    from benepar.spacy_plugin import BeneparComponent
+    
+    nlp = _load_nlp()
+    nlp.add_pipe(BeneparComponent(BENEPAR_MODEL))
+    return nlp
+
+
 # PARSE-TREE FEATURES
 
 
@@ -114,7 +147,220 @@ def _get_parse_tree_features(tokens):
         avg_VP_size, avg_PP_size, avg_parse_tree
     
 
-def parse_tree_features(df):
+# LONG DOCUMENTS
+
+
+# the parse-tree features, in the order of _get_parse_tree_features
+PARSE_TREE_FEATURES = ['NP_per_sent', 'VP_per_sent', 'PP_per_sent', 'SBAR_per_sent', 'SBARQ_per_sent',
+                       'avg_NP_size', 'avg_VP_size', 'avg_PP_size', 'avg_parse_tree']
+
+# constituents counted in the sentence summaries; the lengths are summed for the first three
+SUMMARY_LABELS = ['NP', 'VP', 'PP', 'SBAR', 'SBARQ']
+N_SIZE_LABELS = 3
+
+
+def _sentence_summary(sentence):
+    """
+    Summary of the parse tree of a sentence: height, number of each constituent in SUMMARY_LABELS,
+    summed lengths of NP, VP and PP.
+    """
+    counts = Counter()
+    lengths = Counter()
+    for const in sentence._.constituents:
+        counts.update(const._.labels)
+        for label in const._.labels:
+            lengths[label] += len(const)
+    
+    return [_parse_tree_height(sentence)] + [counts[label] for label in SUMMARY_LABELS] + \
+        [lengths[label] for label in SUMMARY_LABELS[:N_SIZE_LABELS]]
+
+
+def _select_sentences(n_sentences, max_sentences, sampling, random):
+    """
+    Selects which sentences of a document are parsed.
+    
+    :param sampling: 'sample' (random sentences) or 'window' (consecutive sentences at a random position)
+    :returns: sorted indices of the selected sentences
+    """
+    if max_sentences is None or n_sentences <= max_sentences:
+        return np.arange(n_sentences)
+    
+    if sampling == 'sample':
+        return np.sort(random.choice(n_sentences, max_sentences, replace=False))
+    if sampling == 'window':
+        start = random.randint(n_sentences - max_sentences + 1)
+        return np.arange(start, start + max_sentences)
+    
+    raise ValueError("Unknown sampling: " + str(sampling))
+
+
+def _standard_error(values, n_total):
+    """
+    Standard error of the mean of values, which are a sample (without replacement) of n_total values.
+    """
+    k = len(values)
+    if k == n_total:
+        return np.zeros(values.shape[1:])
+    if k < 2:
+        return np.full(values.shape[1:], np.nan)
+    
+    # finite population correction
+    return values.std(axis=0, ddof=1) / np.sqrt(k) * np.sqrt(1 - k / n_total)
+
+
+def _estimate_parse_tree_features(summaries, n_total):
+    """
+    Estimates the parse-tree features of a document from the summaries of a sample of its sentences.
+    
+    :param summaries: matrix with a row for each parsed sentence (see _sentence_summary)
+    :param n_total: the number of sentences in the document
+    :returns: estimates and their standard errors, in the order of PARSE_TREE_FEATURES
+    """
+    summaries = np.asarray(summaries, dtype=np.float64).reshape(-1, 1 + len(SUMMARY_LABELS) + N_SIZE_LABELS)
+    heights = summaries[:, :1]
+    counts = summaries[:, 1:1 + len(SUMMARY_LABELS)]
+    lengths = summaries[:, 1 + len(SUMMARY_LABELS):]
+    size_counts = counts[:, :N_SIZE_LABELS]
+    
+    per_sent = counts.mean(axis=0)
+    per_sent_se = _standard_error(counts, n_total)
+    
+    # avg. size is a ratio of sums (0 if there is no such constituent, as in _get_constituents)
+    total_counts = size_counts.sum(axis=0)
+    sizes = np.divide(lengths.sum(axis=0), total_counts, out=np.zeros(N_SIZE_LABELS), where=total_counts > 0)
+    
+    # standard error of the ratio by the delta method
+    mean_counts = size_counts.mean(axis=0)
+    residual_se = _standard_error(lengths - sizes * size_counts, n_total)
+    sizes_se = np.divide(residual_se, mean_counts, out=np.zeros(N_SIZE_LABELS), where=mean_counts > 0)
+    
+    height = heights.mean(axis=0)
+    height_se = _standard_error(heights, n_total)
+    
+    return np.concatenate([per_sent, sizes, height]), np.concatenate([per_sent_se, sizes_se, height_se])
+
+
+# PARSE CACHE
+
+
+class ParseCache():
+    """
+    Cache of the parse summaries of sentences (see _sentence_summary), shared by all documents.
+    
+    The entries are keyed by a hash of the sentence text (and the benepar model), so repeated sentences
+    (bylines, disclaimers, templates) are parsed only once. The cache holds at most max_size sentences;
+    the least recently used sentences are removed first. It can be saved to and loaded from a JSON file.
+    """
+    
+    def __init__(self, max_size=100000, path=None):
+        """
+        :param max_size: the maximal number of cached sentences
+        :param path: JSON file of the cache; loaded if it exists, used by save
+        """
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        
+        if path is not None and os.path.exists(path):
+            self.load(path)
+    
+    
+    @staticmethod
+    def key(text):
+        return hashlib.sha1((BENEPAR_MODEL + "\0" + text).encode("utf-8")).hexdigest()
+    
+    
+    def get(self, text):
+        """
+        Gets the summaries of the parser sentences of the text, or None if the text isn't cached.
+        """
+        key = self.key(text)
+        summaries = self._entries.get(key)
+        if summaries is None:
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return summaries
+    
+    
+    def put(self, text, summaries):
+        key = self.key(text)
+        self._entries[key] = summaries
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    
+    def hit_rate(self):
+        n = self.hits + self.misses
+        return self.hits / n if n else 0.0
+    
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, "w") as file:
+            json.dump({"benepar_model": BENEPAR_MODEL, "entries": list(self._entries.items())}, file)
+    
+    
+    def load(self, path):
+        with open(path) as file:
+            data = json.load(file)
+        
+        for key, summaries in data["entries"]:
+            self._entries[key] = summaries
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+def _get_summaries(texts, nlp, cache):
+    """
+    Gets the summaries of the parser sentences of each text; texts which aren't cached are parsed at once.
+    
+    :returns: list with a list of summaries for each text
+    """
+    results = [None if cache is None else cache.get(text) for text in texts]
+    
+    missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+    parsed = dict()
+    for text, doc in zip(missing, nlp.pipe(missing)):
+        parsed[text] = [_sentence_summary(sentence) for sentence in doc.sents]
+        if cache is not None:
+            cache.put(text, parsed[text])
+    
+    return [parsed[text] if result is None else result for text, result in zip(texts, results)]
+
+
+def _get_long_document_features(text, nlp_sents, nlp, max_sentences, max_sent_length, sampling, random, cache):
+    sentences = list(nlp_sents(text).sents)
+    selected = _select_sentences(len(sentences), max_sentences, sampling, random)
+    
+    # parse only the selected sentences, each cut to at most max_sent_length tokens
+    texts = list()
+    for i in selected:
+        sentence = sentences[i]
+        if max_sent_length is not None:
+            sentence = sentence[:max_sent_length]
+        texts.append(sentence.text)
+    
+    summaries = [summary for text_summaries in _get_summaries(texts, nlp, cache) for summary in text_summaries]
+    
+    # estimated number of sentences of the whole text (as split by the parser,
+    # which can split a sentence of the sentencizer into more sentences)
+    n_total = max(len(summaries) * len(sentences) / max(len(selected), 1), len(summaries))
+    
+    return _estimate_parse_tree_features(summaries, n_total)
+
+
+def parse_tree_features(df, max_sentences=None, max_sent_length=None, sampling='sample', random_state=None, cache=None):
     """
     Get features which can be extracted from the parse tree of a text. 
     
@@ -129,12 +375,35 @@ def parse_tree_features(df):
     avg_PP_size: Average lenght of an PP
     avg_parse_tree: Average height of a parse Tree
     
+    Long-document mode (if max_sentences or max_sent_length is given):
+    The text is split into sentences by a rule-based sentencizer (the tagger and the parser don't run
+    on the whole text) and only the selected sentences are parsed, one at a time,
+    so the parsing cost of a text is bounded by max_sentences * max_sent_length.
+    The features are estimated from the parsed sentences; for each feature a column <feature>_se
+    with the standard error of the estimate is added (0 if every sentence was parsed).
+    The standard errors assume random sampling; they don't account for cut sentences or windows.
+    
+    Sentence cache (if cache is given):
+    The text is split into sentences (by the spacy model, or by the sentencizer in long-document mode),
+    which are parsed one at a time; the summaries of the parse trees
+    of the sentences are taken from the cache, so repeated sentences are parsed only once.
+    The features are computed from the summaries of the sentences. A sentence is parsed
+    without the rest of the text, so the features can differ slightly from parsing whole texts.
+    
     :param: the dataframe with the dataset
+    :param max_sentences: the maximal number of parsed sentences of a text
+    :param max_sent_length: the maximal number of parsed tokens of a sentence; longer sentences are cut
+    :param sampling: how sentences of long texts are selected; 'sample' (random sentences) or
+                     'window' (consecutive sentences at a random position)
+    :param random_state: seed of the sentence selection
+    :param cache: ParseCache with the summaries of parsed sentences; it's updated with the new sentences
     :returns: the dataframe with the added features
     """
     
-    nlp = spacy.load(SPACY_MODEL, disable=['ner'])
-    nlp.add_pipe(BeneparComponent("benepar_en_small"))
+    if max_sentences is not None or max_sent_length is not None or cache is not None:
+        return _parse_tree_features_long(df, max_sentences, max_sent_length, sampling, random_state, cache)
+    
+    nlp = _load_benepar_nlp()
     
     # parse text
     df['B_Tokens'] = df['Text'].apply(lambda x: nlp(x))
@@ -149,5 +418,165 @@ def parse_tree_features(df):
     
     return df
 
+
+def _parse_tree_features_long(df, max_sentences, max_sent_length, sampling, random_state, cache):
+    long_document = max_sentences is not None or max_sent_length is not None
+    
+    if long_document:
+        # sentences are split by the sentencizer; the parsers run only on the selected sentences
+        nlp_sents = _load_sentencizer(max_length=int(df['Text'].str.len().max()) + 1 if len(df) else None)
+    else:
+        # cache only: every sentence is parsed, so they are split by the model as before
+        nlp_sents = _load_nlp()
+    
+    nlp = _load_benepar_nlp()
+    
+    random = np.random.RandomState(random_state)
+    
+    results = [_get_long_document_features(text, nlp_sents, nlp, max_sentences, max_sent_length, sampling, random, cache)
+               for text in df['Text']]
+    estimates = np.array([result[0] for result in results]).reshape(-1, len(PARSE_TREE_FEATURES))
+    errors = np.array([result[1] for result in results]).reshape(-1, len(PARSE_TREE_FEATURES))
+    
+    # standard errors only if the features are estimated (sentences can be skipped or cut)
+    for i, name in enumerate(PARSE_TREE_FEATURES):
+        df[name] = estimates[:, i]
+        if long_document:
+            df[name + '_se'] = errors[:, i]
     
+    return df
+
+
+# DEPENDENCY-PARSE APPROXIMATION
+
 
+# dependency labels of clauses which are counted as subordinate clauses (SBAR)
+SUBORDINATE_CLAUSE_DEPS = {'advcl', 'ccomp', 'relcl', 'csubj', 'csubjpass'}
+
+# tags of wh-words (a question starting with one is counted as SBARQ)
+WH_TAGS = {'WDT', 'WP', 'WP$', 'WRB'}
+
+
+def _dependency_height(sentence):
+    """
+    Gets the height of the dependency tree of a sentence.
+    """
+    return max((sum(1 for _ in token.ancestors) for token in sentence), default=0)
+
+
+def _dependency_summary(sentence):
+    """
+    Approximation of _sentence_summary from the dependency parse (and noun chunks) of spacy.
+    
+    NP: noun chunks; the length spans from the start of the chunk to the end of the subtree of its head
+    VP: verbs which aren't auxillaries; the length spans from the first auxillary to the end of the subtree
+    PP: prepositions; the length is the length of their subtree
+    SBAR: clauses attached as advcl, ccomp, relcl, csubj or csubjpass
+    SBARQ: question starting with a wh-word
+    height: height of the dependency tree (compared with the parse tree it needs calibration)
+    """
+    counts = Counter()
+    lengths = Counter()
+    
+    for chunk in sentence.noun_chunks:
+        counts['NP'] += 1
+        lengths['NP'] += chunk.root.right_edge.i - chunk.start + 1
+    
+    for token in sentence:
+        if token.pos_ in ('VERB', 'AUX') and token.dep_ not in ('aux', 'auxpass'):
+            start = min([token.i] + [child.i for child in token.children if child.dep_ in ('aux', 'auxpass', 'neg')])
+            counts['VP'] += 1
+            lengths['VP'] += token.right_edge.i - start + 1
+        if token.dep_ in ('prep', 'agent'):
+            counts['PP'] += 1
+            lengths['PP'] += token.right_edge.i - token.left_edge.i + 1
+        if token.dep_ in SUBORDINATE_CLAUSE_DEPS:
+            counts['SBAR'] += 1
+    
+    if len(sentence) and sentence[0].tag_ in WH_TAGS and sentence.text.rstrip().endswith('?'):
+        counts['SBARQ'] += 1
+    
+    return [_dependency_height(sentence)] + [counts[label] for label in SUMMARY_LABELS] + \
+        [lengths[label] for label in SUMMARY_LABELS[:N_SIZE_LABELS]]
+
+
+def _get_dependency_features(doc):
+    summaries = [_dependency_summary(sentence) for sentence in doc.sents]
+    return _estimate_parse_tree_features(summaries, len(summaries))[0]
+
+
+def dependency_parse_tree_features(df, calibration=None, batch_size=256):
+    """
+    Gets approximations of the parse-tree features (see parse_tree_features) from the dependency parse of spacy,
+    which is much faster than benepar.
+    
+    The approximations are correlated with the benepar features but are on a different scale;
+    calibration (made by calibration_report) maps them linearly to the scale of the benepar features.
+    
+    Adds features:
+    NP_per_sent, VP_per_sent, PP_per_sent, SBAR_per_sent, SBARQ_per_sent,
+    avg_NP_size, avg_VP_size, avg_PP_size, avg_parse_tree
+    
+    :param: the dataframe with the dataset
+    :param calibration: dataframe with the columns slope and intercept for each feature (index); None for raw approximations
+    :param batch_size: the number of texts spacy processes at once
+    :returns: the dataframe with the added features
+    """
+    
+    nlp = _load_nlp()
+    
+    features = np.array([_get_dependency_features(doc) for doc in nlp.pipe(df['Text'], batch_size=batch_size)])
+    features = features.reshape(-1, len(PARSE_TREE_FEATURES))
+    
+    for i, name in enumerate(PARSE_TREE_FEATURES):
+        df[name] = features[:, i]
+        if calibration is not None and name in calibration.index:
+            df[name] = calibration.loc[name, 'slope'] * df[name] + calibration.loc[name, 'intercept']
+    
+    return df
+
+
+def calibration_report(df, n_samples=200, random_state=None):
+    """
+    Compares the dependency-parse approximations with the benepar parse-tree features on a sample of texts.
+    
+    For each feature the report has:
+    pearson, spearman: correlation coefs. of the approximation and the benepar feature
+    mae: mean absolute error of the calibrated approximation
+    slope, intercept: least-squares linear map from the approximation to the benepar feature
+    
+    :param df: the dataframe with the dataset (the Text column is used)
+    :param n_samples: the number of sampled texts
+    :param random_state: seed of the sampling
+    :returns: the report (dataframe, one row for each feature), dict with the time (in seconds) of each backend
+    """
+    from time import perf_counter
+    from scipy.stats import pearsonr, spearmanr
+    
+    sample = df[['Text']].sample(n=min(n_samples, len(df)), random_state=random_state)
+    
+    start = perf_counter()
+    benepar_features = parse_tree_features(sample.copy())
+    times = {'benepar': perf_counter() - start}
+    
+    start = perf_counter()
+    dependency_features = dependency_parse_tree_features(sample.copy())
+    times['dependency'] = perf_counter() - start
+    
+    rows = list()
+    for name in PARSE_TREE_FEATURES:
+        x = dependency_features[name].to_numpy(dtype=np.float64)
+        y = benepar_features[name].to_numpy(dtype=np.float64)
+        
+        if np.ptp(x) > 0:
+            slope, intercept = np.polyfit(x, y, 1)
+            pearson, spearman = pearsonr(x, y)[0], spearmanr(x, y)[0]
+        else:
+            slope, intercept = 0.0, y.mean()
+            pearson, spearman = np.nan, np.nan
+        
+        mae = np.abs(slope * x + intercept - y).mean()
+        rows.append({'feature': name, 'pearson': pearson, 'spearman': spearman, 'mae': mae,
+                     'slope': slope, 'intercept': intercept})
+    
+    return pd.DataFrame(rows).set_index('feature'), times
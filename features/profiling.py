@@ -0,0 +1,184 @@
+"""
+Profiling of the feature pipeline.
+
+profile_features runs the feature functions (classic_features and non_classic_features) on a dataset
+and records the cost of every call: the time and, with tracemalloc, the memory allocated by the call.
+The texts are grouped into buckets by their number of tokens and each bucket is processed in chunks
+of chunk_size texts, so the cost of each feature function can be compared across document lengths.
+
+Profile.summary gives a table with the cost of each function, including the estimated fixed cost
+of a call (e.g. loading the models) and the cost per 1000 tokens; Profile.bucket_table gives the time
+per text of each function in each bucket. Profile.save_folded writes the time in the folded stack format,
+which is read by flame graph tools (flamegraph.pl, speedscope, ...).
+
+Example:
+    profile = profile_features(df, chunk_size=64)
+    print(profile.summary())
+    profile.save_folded('features.folded')
+"""
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import classic_features as cf
+import non_classic_features as ncf
+
+# the profiled feature functions, in the order in which they are run (each needs the ones before it)
+STEPS = [
+    cf.words_and_sentences,
+    cf.syllables,
+    cf.polysyllables,
+    cf.difficult_words_pct,
+    cf.pos_features,
+    ncf.parse_tree_features,
+]
+
+# upper bounds of the token-count buckets (the last bucket has no upper bound)
+BUCKETS = [100, 250, 500, 1000, 2000]
+
+
+def _bucket_labels(buckets):
+    bounds = [0] + list(buckets)
+    labels = [str(low) + '-' + str(high) for low, high in zip(bounds[:-1], bounds[1:])]
+    return labels + [str(bounds[-1]) + '+']
+
+
+def _count_tokens(texts):
+    """
+    Number of tokens of each text, found with the spacy tokenizer only.
+    """
+    import spacy
+
+    tokenizer = spacy.load(cf.SPACY_MODEL).tokenizer
+    return np.array([len(tokenizer(text)) for text in texts], dtype=np.int64)
+
+
+class Profile():
+    """
+    Results of profile_features; records has one row for each call of a feature function.
+    """
+
+    def __init__(self, records):
+        self.records = pd.DataFrame(records, columns=['step', 'bucket', 'n_texts', 'n_tokens', 'time',
+                                                      'allocated', 'peak_memory'])
+
+
+    def summary(self):
+        """
+        Table with the cost of each feature function.
+
+        Columns: the number of calls, total time [s], share of the total time, time per call [s],
+        time per text [ms], the estimated fixed time of a call [s] and time per 1000 tokens [s]
+        (least squares fit of the call times), mean allocated memory and the highest peak memory of a call [MiB].
+        """
+
+        rows = list()
+        steps = list()
+        total = self.records['time'].sum()
+        for step, calls in self.records.groupby('step', sort=False):
+            row = {
+                'calls': len(calls),
+                'total_time': calls['time'].sum(),
+                'share': calls['time'].sum() / total if total > 0 else np.nan,
+                'time_per_call': calls['time'].mean(),
+                'ms_per_text': 1000 * calls['time'].sum() / calls['n_texts'].sum(),
+                'fixed_time': np.nan,
+                'time_per_1k_tokens': np.nan,
+                'allocated_mib': calls['allocated'].mean() / 2 ** 20,
+                'peak_mib': calls['peak_memory'].max() / 2 ** 20,
+            }
+
+            # time of a call = fixed time + time per token * n_tokens
+            if calls['n_tokens'].nunique() > 1:
+                A = np.column_stack([np.ones(len(calls)), calls['n_tokens'].to_numpy(dtype=np.float64)])
+                (fixed, per_token), _, _, _ = np.linalg.lstsq(A, calls['time'].to_numpy(), rcond=None)
+                row['fixed_time'] = fixed
+                row['time_per_1k_tokens'] = 1000 * per_token
+
+            rows.append(row)
+            steps.append(step)
+
+        return pd.DataFrame(rows, index=steps)
+
+
+    def bucket_table(self):
+        """
+        Table with the time per text [ms] of each feature function (rows) in each token-count bucket (columns).
+        """
+
+        grouped = self.records.groupby(['step', 'bucket'], sort=False)[['time', 'n_texts']].sum()
+        table = (1000 * grouped['time'] / grouped['n_texts']).unstack('bucket')
+
+        steps = list(dict.fromkeys(self.records['step']))
+        buckets = list(dict.fromkeys(self.records['bucket']))
+        return table.loc[steps, buckets]
+
+
+    def folded(self):
+        """
+        Lines in the folded stack format: "features;tokens <bucket>;<function> <time in microseconds>".
+        """
+
+        grouped = self.records.groupby(['bucket', 'step'], sort=False)['time'].sum()
+        return ['features;tokens ' + bucket + ';' + step + ' ' + str(int(round(1e6 * value)))
+                for (bucket, step), value in grouped.items()]
+
+
+    def save_folded(self, path):
+        with open(path, 'w') as file:
+            file.write('\n'.join(self.folded()) + '\n')
+
+
+def profile_features(df, steps=STEPS, buckets=BUCKETS, chunk_size=64, trace_memory=True):
+    """
+    Runs the feature functions on the texts of the dataframe and records the cost of every call.
+
+    :param df: the dataframe with the dataset (texts in the Text column); it isn't changed
+    :param steps: the feature functions, in the order in which they are run
+    :param buckets: upper bounds of the token-count buckets
+    :param chunk_size: the number of texts given to one call of the feature functions
+    :param trace_memory: whether to record the allocated memory with tracemalloc (makes the calls slower)
+    :returns: Profile
+    """
+
+    n_tokens = _count_tokens(df['Text'])
+    bucket_ids = np.searchsorted(buckets, n_tokens, side='left')
+    labels = _bucket_labels(buckets)
+
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    records = list()
+    try:
+        for bucket_id, label in enumerate(labels):
+            positions = np.flatnonzero(bucket_ids == bucket_id)
+
+            for start in range(0, len(positions), chunk_size):
+                chunk = positions[start:start + chunk_size]
+                chunk_df = df.iloc[chunk].copy()
+                chunk_tokens = int(n_tokens[chunk].sum())
+
+                for step in steps:
+                    if trace_memory:
+                        tracemalloc.reset_peak()
+                        before = tracemalloc.get_traced_memory()[0]
+
+                    start_time = time.perf_counter()
+                    chunk_df = step(chunk_df)
+                    elapsed = time.perf_counter() - start_time
+
+                    allocated = peak_memory = np.nan
+                    if trace_memory:
+                        current, peak = tracemalloc.get_traced_memory()
+                        allocated = current - before
+                        peak_memory = peak - before
+
+                    records.append((step.__name__, label, len(chunk), chunk_tokens, elapsed, allocated, peak_memory))
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    return Profile(records)
@@ -0,0 +1,215 @@
+"""
+Syllable counting engines.
+
+Pyphen is a hyphenation dictionary, not a syllable counter: it doesn't hyphenate every syllable
+(e.g. short words and word endings) and classic_features.syllables with its default engine 'pyphen_text'
+applies it to the whole text, punctuation and numbers included. The engines here count the syllables of each word:
+
+- 'cmudict': the number of vowels in the pronunciation of the word in the CMU Pronouncing Dictionary,
+  looked up in a table of sorted words (a compact numpy array, searched with binary search for all words
+  of a text at once); words which aren't in the table are counted by the fallback engine
+- 'heuristic': the number of vowel groups, corrected for silent endings (-e, -ed, -es)
+- 'pyphen': the number of hyphens inserted by pyphen + 1
+
+The table is built once from the CMU dictionary file (https://github.com/cmusphinx/cmudict, cmudict.dict):
+    python syllable_engine.py path/to/cmudict.dict
+which writes resources/cmudict_syllables.npz. The table isn't part of the repository; without it
+the 'cmudict' engine warns and counts all words with the fallback engine.
+
+Example:
+    count = get_counter('cmudict', fallback='heuristic')  # needs the table
+    count(['readability', 'formula'])  # array([5, 3])
+"""
+import os
+import re
+import sys
+import warnings
+from functools import lru_cache
+
+import numpy as np
+
+# the table built by build_table
+SYLLABLE_TABLE = "resources/cmudict_syllables.npz"
+
+ENGINES = ['cmudict', 'heuristic', 'pyphen']
+
+_VOWEL_GROUPS = re.compile(r'[aeiouy]+')
+
+
+# HEURISTIC
+
+
+@lru_cache(maxsize=2 ** 16)
+def heuristic_syllables(word):
+    """
+    Counts the vowel groups of the word, without silent endings. Words without letters have 1 syllable.
+    """
+    word = word.lower()
+    n = len(_VOWEL_GROUPS.findall(word))
+
+    if n > 1:
+        # silent e (make), but not in -le (table) or a vowel pair (free)
+        if word.endswith('e') and not word.endswith(('le', 'ee', 'ie', 'ye', 'oe')):
+            n -= 1
+        # -ed is silent except after t and d (jumped, but wanted)
+        elif word.endswith('ed') and not word.endswith(('ted', 'ded', 'eed', 'ied')):
+            n -= 1
+        # -es is silent except after sibilants (makes, but boxes)
+        elif word.endswith('es') and not word.endswith(('ses', 'xes', 'zes', 'ches', 'shes', 'ces', 'ges', 'ies', 'ees')):
+            n -= 1
+
+    return max(n, 1)
+
+
+# PYPHEN
+
+
+@lru_cache(maxsize=None)
+def _get_pyphen():
+    import pyphen
+
+    return pyphen.Pyphen(lang='en_EN')
+
+
+def pyphen_syllables(word):
+    return _get_pyphen().inserted(word).count("-") + 1
+
+
+# CMU DICTIONARY TABLE
+
+
+class SyllableTable():
+    """
+    Syllable counts of the words of a pronunciation dictionary.
+
+    The words are stored as a sorted array of fixed-width ascii strings and the counts
+    as an array of uint8, so the table of the CMU dictionary takes a few MB and loads at once.
+    """
+
+    def __init__(self, words, counts):
+        self.words = np.asarray(words, dtype=np.bytes_)
+        self.counts = np.asarray(counts, dtype=np.uint8)
+
+
+    def __len__(self):
+        return len(self.words)
+
+
+    def lookup(self, words):
+        """
+        Finds the syllable counts of the words.
+
+        :param words: list of strings (the lookup isn't case sensitive)
+        :returns: array of counts, -1 for words which aren't in the table
+        """
+
+        result = np.full(len(words), -1, dtype=np.int64)
+        if not len(words) or not len(self.words):
+            return result
+
+        width = self.words.dtype.itemsize
+        keys = [word.lower().encode('ascii', 'replace') for word in words]
+        # longer words would be truncated to the width of the table
+        fits = np.array([len(key) <= width for key in keys])
+
+        keys = np.array(keys, dtype=self.words.dtype)
+        idx = np.minimum(np.searchsorted(self.words, keys), len(self.words) - 1)
+        found = fits & (self.words[idx] == keys)
+        result[found] = self.counts[idx[found]]
+
+        return result
+
+
+    def save(self, path=SYLLABLE_TABLE):
+        np.savez_compressed(path, words=self.words, counts=self.counts)
+
+
+    @classmethod
+    def load(cls, path=SYLLABLE_TABLE):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(arrays['words'], arrays['counts'])
+
+
+def build_table(dictionary_path, path=SYLLABLE_TABLE):
+    """
+    Builds the syllable table from a dictionary in the CMU format (a word and its phonemes on each line,
+    vowels end with a stress digit, alternative pronunciations are marked as word(2)) and saves it.
+    The first pronunciation of each word is used.
+
+    :param dictionary_path: path of the dictionary file (cmudict.dict)
+    :param path: path of the table; not saved if None
+    :returns: SyllableTable
+    """
+
+    counts = dict()
+    with open(dictionary_path, encoding='latin-1') as file:
+        for line in file:
+            if not line.strip() or line.startswith(';;;'):
+                continue
+
+            # comments after the pronunciation start with #
+            parts = line.split('#')[0].split()
+            word = re.sub(r'\(\d+\)$', '', parts[0]).lower()
+            if word not in counts:
+                counts[word] = sum(1 for phoneme in parts[1:] if phoneme[-1].isdigit())
+
+    words = sorted(word for word in counts if word.isascii())
+    table = SyllableTable(np.array([word.encode('ascii') for word in words]), [counts[word] for word in words])
+
+    if path is not None:
+        table.save(path)
+
+    return table
+
+
+@lru_cache(maxsize=None)
+def _get_table(path=SYLLABLE_TABLE):
+    return SyllableTable.load(path)
+
+
+# COUNTERS
+
+
+@lru_cache(maxsize=None)
+def get_counter(engine='heuristic', fallback='heuristic', table_path=SYLLABLE_TABLE):
+    """
+    Gets a function which counts the syllables of each word in a list of words.
+
+    :param engine: 'cmudict', 'heuristic' or 'pyphen'
+    :param fallback: the engine for words which aren't in the table ('heuristic' or 'pyphen'; only for 'cmudict')
+    :param table_path: path of the table built by build_table; if it doesn't exist, 'cmudict' uses only the fallback
+    :returns: function list of words -> array of syllable counts
+    """
+
+    if engine not in ENGINES:
+        raise ValueError("Unknown syllable engine: " + str(engine))
+    if fallback not in ('heuristic', 'pyphen'):
+        raise ValueError("Unknown fallback syllable engine: " + str(fallback))
+
+    if engine == 'cmudict' and not os.path.exists(table_path):
+        warnings.warn("Syllable table " + table_path + " not found (see syllable_engine.build_table); "
+                      "counting syllables with the " + fallback + " engine.")
+        engine = fallback
+
+    if engine == 'heuristic':
+        return lambda words: np.array([heuristic_syllables(word) for word in words], dtype=np.int64)
+    if engine == 'pyphen':
+        return lambda words: np.array([pyphen_syllables(word) for word in words], dtype=np.int64)
+
+    table = _get_table(table_path)
+    count_word = heuristic_syllables if fallback == 'heuristic' else pyphen_syllables
+
+    def count(words):
+        counts = table.lookup(words)
+        for i in np.flatnonzero(counts < 0):
+            counts[i] = count_word(words[i])
+
+        # words without letters (numbers, symbols) and words with a zero count in the table have 1 syllable
+        return np.maximum(counts, 1)
+
+    return count
+
+
+if __name__ == '__main__':
+    table = build_table(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else SYLLABLE_TABLE)
+    print("Syllable table with " + str(len(table)) + " words saved.")
@@ -11,12 +11,29 @@ Formulas implemented:
 - Gunning fog index
 
 The functions will calculate the formula for every text in the dataframe, creating a column with the result.
+
+For scoring raw texts directly (without a dataframe), use score_texts;
+for scoring document statistics (features/document_stats.py), use score_stats.
 """
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# the following spacy model has to be downloaded
+SPACY_MODEL = "en_core_web_sm"
+
+DALE_CHALL_EASY_WORDS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "..", "features", "resources", "dale_chall_easy_word_list.txt")
 
 
 # FLESCH 
 
 
+def _flesch(avg_words_per_sentence, avg_syllables_per_word):
+    return 206.835 - 1.015 * avg_words_per_sentence - 84.6 * avg_syllables_per_word
+
+
 def flesch(df):
     """
     Calculates the Flesch formula for each text.
@@ -31,7 +48,7 @@ def flesch(df):
     """
     
     # Flesch formula
-    df["Flesch"] = 206.835 - 1.015 * df["Avg_words_per_sentence"] - 84.6 * df["Avg_syllables_per_word"]
+    df["Flesch"] = _flesch(df["Avg_words_per_sentence"], df["Avg_syllables_per_word"])
     
     return df
 
@@ -39,6 +56,13 @@ def flesch(df):
 # DALE-CHALL
 
 
+def _dale_chall(avg_words_per_sentence, difficult_word_percent):
+    score = 0.1579 * (difficult_word_percent * 100) + 0.0496 * avg_words_per_sentence
+    
+    # adjust if percentage of difficult words is greater than 5%
+    return score + 3.6365 * (difficult_word_percent > 0.05)
+
+
 def dale_chall(df):
     """
     Calculates the Dale-Chall formula for each text.
@@ -53,10 +77,7 @@ def dale_chall(df):
     """
 
     # Dale-Chall formula
-    df["Dale_Chall"] = 0.1579 * (df["Difficult_word_percent"] * 100) + 0.0496 * df["Avg_words_per_sentence"]
-    
-    # adjust if percentage of difficul words is greater than 5%
-    df.loc[df["Difficult_word_percent"] > 0.05, "Dale_Chall"] += 3.6365
+    df["Dale_Chall"] = _dale_chall(df["Avg_words_per_sentence"], df["Difficult_word_percent"])
         
     return df
 
@@ -64,6 +85,10 @@ def dale_chall(df):
 # GUNNING FOG
 
 
+def _gunning_fog(avg_words_per_sentence, complex_word_percent):
+    return 0.4 * (avg_words_per_sentence + 100 * complex_word_percent)
+
+
 def gunning_fog(df):
     """
     Calculates the Gunning fog formula for each text.
@@ -78,6 +103,152 @@ def gunning_fog(df):
     """
 
     # Gunning fog formula
-    df["Gunning_fog"] = 0.4 * (df["Avg_words_per_sentence"] + 100 * df["Complex_word_percent"])
+    df["Gunning_fog"] = _gunning_fog(df["Avg_words_per_sentence"], df["Complex_word_percent"])
     
-    return df
\ No newline at end of file
+    return df
+
+
+# SCORING RAW TEXTS
+
+
+# base counts needed by each formula
+FORMULA_COUNTS = {
+    'Flesch': ['n_words', 'n_sentences', 'n_syllables'],
+    'Dale_Chall': ['n_words', 'n_sentences', 'n_difficult_words'],
+    'Gunning_fog': ['n_words', 'n_sentences', 'n_polysyllables'],
+}
+
+FORMULAS = list(FORMULA_COUNTS.keys())
+
+
+@lru_cache(maxsize=None)
+def _get_sentence_nlp():
+    """
+    Spacy pipeline with only the components needed for words and sentences (tokenizer and parser).
+    """
+    import spacy
+
+    nlp = spacy.load(SPACY_MODEL)
+    for name in list(nlp.pipe_names):
+        if name not in ('tok2vec', 'parser'):
+            nlp.remove_pipe(name)
+
+    return nlp
+
+
+@lru_cache(maxsize=None)
+def _get_pyphen():
+    import pyphen
+
+    return pyphen.Pyphen(lang='en_EN')
+
+
+@lru_cache(maxsize=None)
+def _get_easy_words():
+    with open(DALE_CHALL_EASY_WORDS) as file:
+        return frozenset(line.rstrip('\n').lower() for line in file)
+
+
+def _count(doc, counts):
+    """
+    Computes the wanted base counts of a parsed text; the same definitions as in classic_features.
+    """
+    words = [token.text for token in doc if not token.is_punct]
+
+    values = list()
+    for name in counts:
+        if name == 'n_words':
+            values.append(len(words))
+        elif name == 'n_sentences':
+            values.append(sum(1 for _ in doc.sents))
+        elif name == 'n_syllables':
+            # number of syllables is number of hyphens in the text + number of words
+            values.append(len(words) + _get_pyphen().inserted(doc.text).count("-"))
+        elif name == 'n_polysyllables':
+            dic = _get_pyphen()
+            values.append(sum(1 for word in words if dic.inserted(word).count("-") >= 2))
+        elif name == 'n_difficult_words':
+            easy_words = _get_easy_words()
+            values.append(sum(1 for word in words if word.lower() not in easy_words))
+
+    return tuple(values)
+
+
+def score_texts(texts, formulas=FORMULAS, batch_size=256):
+    """
+    Calculates readability formulas directly from raw texts, without building a dataframe.
+    Only the base counts needed by the wanted formulas are computed and only the counts
+    (not the parsed documents) are kept, so the texts can be a stream of any length.
+
+    The scores are the same as the ones given by flesch, dale_chall and gunning_fog
+    on features from classic_features.
+
+    :param texts: iterable of strings
+    :param formulas: names of the wanted formulas ('Flesch', 'Dale_Chall', 'Gunning_fog')
+    :param batch_size: the number of texts spacy processes at once
+    :returns: numpy structured array with a float64 field for each formula, one row per text
+    """
+
+    for formula in formulas:
+        if formula not in FORMULA_COUNTS:
+            raise ValueError("Unknown formula: " + str(formula))
+
+    # resolve the base counts needed by the formulas
+    counts = list()
+    for formula in formulas:
+        for name in FORMULA_COUNTS[formula]:
+            if name not in counts:
+                counts.append(name)
+
+    nlp = _get_sentence_nlp()
+    count_dtype = np.dtype([(name, np.int64) for name in counts])
+
+    chunks = list()
+    batch = list()
+    for doc in nlp.pipe((str(text) for text in texts), batch_size=batch_size):
+        batch.append(_count(doc, counts))
+        if len(batch) == batch_size:
+            chunks.append(np.array(batch, dtype=count_dtype))
+            batch = list()
+    chunks.append(np.array(batch, dtype=count_dtype))
+
+    return _scores(np.concatenate(chunks), formulas)
+
+
+def _scores(counts, formulas):
+    """
+    Calculates the formulas from the base counts.
+
+    :param counts: anything which gives an array for each count name (structured array, DocumentStatsBatch, dict)
+    """
+
+    n_words = np.asarray(counts['n_words'])
+    scores = np.empty(len(n_words), dtype=[(formula, np.float64) for formula in formulas])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_words_per_sentence = n_words / counts['n_sentences']
+        for formula in formulas:
+            if formula == 'Flesch':
+                scores[formula] = _flesch(avg_words_per_sentence, counts['n_syllables'] / n_words)
+            elif formula == 'Dale_Chall':
+                scores[formula] = _dale_chall(avg_words_per_sentence, counts['n_difficult_words'] / n_words)
+            elif formula == 'Gunning_fog':
+                scores[formula] = _gunning_fog(avg_words_per_sentence, counts['n_polysyllables'] / n_words)
+
+    return scores
+
+
+def score_stats(stats, formulas=FORMULAS):
+    """
+    Calculates readability formulas from document statistics which were already computed
+    (features/document_stats.py), so the texts don't have to be parsed again.
+
+    :param stats: DocumentStatsBatch, or a dict with an array for each needed count (see FORMULA_COUNTS)
+    :param formulas: names of the wanted formulas ('Flesch', 'Dale_Chall', 'Gunning_fog')
+    :returns: numpy structured array with a float64 field for each formula, one row per text
+    """
+
+    for formula in formulas:
+        if formula not in FORMULA_COUNTS:
+            raise ValueError("Unknown formula: " + str(formula))
+
+    return _scores(stats, formulas)
@@ -1,34 +1,41 @@
-from keras.models import Sequential, load_model
-from keras.layers import Dense, Dropout
-from keras.utils import to_categorical
-from keras.callbacks import EarlyStopping
-from keras.optimizers import Adam
 import numpy as np
-import tensorflow as tf
 
-from .utils.utils import discretize
+from .utils.utils import discretize, feature_columns_of, dense_features, order_features, DISCRETIZATION_THRESHOLDS
+from .utils.artifact import save_artifact, load_artifact
+from .utils.mlp_inference import NumpyMLP
 
 class MultilayerPerceptron():
     """
     Class for the Multilayer Perceptron (MLP) model.
     Implemented in Keras.
+    
+    Keras and TensorFlow are imported only for training. After training (or loading)
+    the weights are exported and prediction is a numpy forward pass (see utils.mlp_inference).
     """
     
-    def __init__(self, input_dim=None, verbose=0, save_model=False, use_saved_model=False, model_path='./models/saved_models/mlp.h5'):
+    def __init__(self, input_dim=None, verbose=0, save_model=False, use_saved_model=False, model_path='./models/saved_models/mlp'):
         self.model_path = model_path
         self.save_model = save_model
+        self.feature_columns = None
+        self.thresholds = DISCRETIZATION_THRESHOLDS
         
         self.input_dim = input_dim
         self.verbose = verbose
-
-        # do not write warnings
-        tf.logging.set_verbosity(tf.logging.ERROR)
+        
+        # Keras model, used only for training
+        self.model = None
+        # exported weights, used for prediction
+        self.inference_model = None
         
         if use_saved_model:
-            self.model = load_model(model_path)
+            self.load(model_path)
     
     
     def fit(self, X_train, y_train):
+        from keras.utils import to_categorical
+        
+        self.feature_columns = feature_columns_of(X_train)
+        X_train = dense_features(X_train)
         self.model = self._make_model()
         
         y_train_cat = to_categorical(y_train, num_classes=5)
@@ -39,18 +46,81 @@ class MultilayerPerceptron():
             batch_size=64,
             verbose=self.verbose)
         
+        self.inference_model = NumpyMLP.from_keras(self.model)
+        
+        if self.save_model:
+            self.save(self.model_path)
+    
+    
+    def fit_stream(self, chunks, epochs=150, batch_size=64):
+        """
+        Trains the model on chunks of data without loading the whole table.
+        The chunks are fed to Keras through a generator of minibatches, so only one chunk is in memory at a time.
+        The first pass over the chunks only counts the batches of an epoch.
+        
+        :param chunks: re-iterable source of (X_chunk, y_chunk) tuples (see utils.streaming)
+        """
+        
+        steps_per_epoch = 0
+        for X, y in chunks:
+            steps_per_epoch += -(-len(X) // batch_size)
+            if self.input_dim is None:
+                self.input_dim = X.shape[1]
+        
+        self.feature_columns = getattr(chunks, 'feature_columns', None)
+        self.model = self._make_model()
+        
+        self.model.fit_generator(
+            _minibatches(chunks, batch_size),
+            steps_per_epoch=steps_per_epoch,
+            epochs=epochs,
+            verbose=self.verbose)
+        
+        self.inference_model = NumpyMLP.from_keras(self.model)
+        
         if self.save_model:
-            self.model.save(self.model_path)
+            self.save(self.model_path)
     
     
     def predict(self, X_test): 
-        y_pred_cat = self.model.predict(X_test)
+        X_test = order_features(X_test, self.feature_columns)
+        y_pred_cat = self.inference_model.predict(X_test)
         y_pred = np.argmax(y_pred_cat, axis=1)
         
-        return discretize(y_pred)
+        return discretize(y_pred, self.thresholds)
+    
+    
+    def save(self, path):
+        """
+        Saves the trained model as a model artifact (see utils.artifact).
+        The Keras model is saved too if it is available (i.e. the model was trained, not loaded).
+        """
+        
+        model = self.model if self.model is not None else self.inference_model
+        save_artifact(path, model, 'mlp', self.feature_columns, self.thresholds,
+                      params={'input_dim': self.input_dim})
+    
+    
+    def load(self, path):
+        """
+        Loads the exported weights, the feature column order and the thresholds from a model artifact.
+        TensorFlow is not loaded.
+        """
+        
+        self.model = None
+        self.inference_model, metadata = load_artifact(path)
+        self.feature_columns = metadata['feature_columns']
+        self.thresholds = metadata['thresholds']
     
     
     def _make_model(self):
+        from keras.models import Sequential
+        from keras.layers import Dense, Dropout
+        from keras.optimizers import Adam
+        import tensorflow as tf
+        
+        # do not write warnings
+        tf.logging.set_verbosity(tf.logging.ERROR)
         
         # architecture
         model = Sequential()
@@ -68,4 +138,16 @@ class MultilayerPerceptron():
               metrics=['mse'])
         
         return model
-        
\ No newline at end of file
+
+
+def _minibatches(chunks, batch_size):
+    """
+    Endless generator of minibatches (X, y one-hot encoded) over the chunks, as Keras expects.
+    """
+    from keras.utils import to_categorical
+    
+    while True:
+        for X, y in chunks:
+            y_cat = to_categorical(y, num_classes=5)
+            for start in range(0, len(X), batch_size):
+                yield X[start:start + batch_size], y_cat[start:start + batch_size]
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+
+from .utils.artifact import load_portable
+from .utils.utils import order_features
+
+
+class Predictor():
+    """
+    Class for serving any of the trained models (RandomForest, XGBoost,
+    SupportVectorMachine, MultilayerPerceptron) from its model artifact.
+
+    The portable export of the artifact is used (see utils.artifact), so only numpy is needed
+    and all models are served the same way. A loaded predictor is read-only and can be
+    shared by the threads of a thread pool; the heavy work is done by numpy, which releases the GIL.
+    """
+
+    def __init__(self, model, metadata):
+        self.model = model
+        self.metadata = metadata
+        self.backend = metadata['backend']
+        self.feature_columns = metadata['feature_columns']
+        self.thresholds = np.asarray(metadata['thresholds'])
+
+        # output buffers, one for each thread
+        self._local = threading.local()
+
+
+    @classmethod
+    def load(cls, path, mmap=True, n_threads=1):
+        """
+        Loads the predictor from a model artifact directory.
+
+        :param path: artifact directory
+        :param mmap: whether large arrays (node tables) are memory-mapped
+        :param n_threads: the number of threads used inside a single prediction (tree ensembles only)
+        """
+
+        model, metadata = load_portable(path, mmap=mmap, n_threads=n_threads)
+        return cls(model, metadata)
+
+
+    def predict_batch(self, features, out=None):
+        """
+        Predicts the readability level of every row of features.
+
+        :param features: dataframe (columns are reordered into the training order) or an array of shape (n_samples, n_features)
+        :param out: array of at least n_samples elements (ValueError otherwise) into which the levels are written;
+                    if not given, a buffer of the current thread is reused, so the returned array is valid
+                    only until the next call in the same thread (copy it to keep it)
+        :returns: array with the readability level (0.0 - 4.0) of every sample
+        """
+
+        # each model converts the features into the dtype it was trained with
+        X = np.asarray(order_features(features, self.feature_columns))
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n = X.shape[0]
+
+        if out is None:
+            out = self._buffer(n)
+        elif len(out) < n:
+            raise ValueError("out has " + str(len(out)) + " elements, but there are " + str(n) + " samples.")
+        else:
+            out = out[:n]
+
+        y_pred = self.model.predict(X)
+        if self.backend == 'mlp':
+            # the MLP outputs a score for each level
+            y_pred = np.argmax(y_pred, axis=1)
+
+        out[:] = np.digitize(y_pred, self.thresholds)
+
+        return out
+
+
+    def _buffer(self, n):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < n:
+            # grow to the next power of two, so the buffer is rarely reallocated
+            buffer = np.empty(1 << max(n - 1, 0).bit_length())
+            self._local.buffer = buffer
+
+        return buffer[:n]
@@ -1,7 +1,8 @@
-from sklearn.ensemble import RandomForestRegressor
-import pickle
+import numpy as np
 
-from .utils.utils import discretize
+from .utils.utils import discretize, feature_columns_of, dense_features, order_features, make_regressor, DISCRETIZATION_THRESHOLDS
+from .utils.artifact import save_artifact, load_artifact
+from .utils.tree_inference import CompiledTreeEnsemble
 
 
 
@@ -10,27 +11,107 @@ class RandomForest():
     Class for the Random Forest regressor.
     """
     
-    def __init__(self, max_depth=20, n_estimators=100, save_model=False, use_saved_model=False, model_path='./models/saved_models/rf.pickle'):
+    def __init__(self, max_depth=20, n_estimators=100, save_model=False, use_saved_model=False, model_path='./models/saved_models/rf', random_state=None):
         self.model_path = model_path
         self.save_model = save_model
+        self.random_state = random_state
+        self.feature_columns = None
+        self.thresholds = DISCRETIZATION_THRESHOLDS
+        self.compiled = None
         
         if use_saved_model:
-            with open(self.model_path, 'rb') as file:
-                self.model = pickle.load(file)
+            self.load(self.model_path)
         else:
-            self.model = RandomForestRegressor(max_depth=max_depth, n_estimators=n_estimators)    
+            self.model = make_regressor('random_forest', max_depth=max_depth, n_estimators=n_estimators, random_state=random_state)    
     
     
     def fit(self, X_train, y_train):
+        self.compiled = None
+        self.feature_columns = feature_columns_of(X_train)
+        X_train = dense_features(X_train)
         self.model.fit(X_train, y_train)
         
         if self.save_model:
-            with open(self.model_path, 'wb') as handle:
-                pickle.dump(self.model, handle)
+            self.save(self.model_path)
     
     
     def predict(self, X_test):
-        return discretize(self.model.predict(X_test))
+        X_test = order_features(X_test, self.feature_columns)
+        
+        if self.compiled is not None:
+            return discretize(self.compiled.predict(X_test), self.thresholds)
+        return discretize(self.model.predict(X_test), self.thresholds)
+    
+    
+    def compile(self, n_threads=1):
+        """
+        Converts the trained model into flat node tables used for prediction from now on
+        (see utils.tree_inference). Much faster for small batches; retraining drops the compiled model.
+        
+        :param n_threads: the number of threads among which the trees are divided during prediction
+        """
+        
+        self.compiled = CompiledTreeEnsemble.from_sklearn(self.model, n_threads=n_threads)
+    
+    
+    def save(self, path):
+        """
+        Saves the trained model as a model artifact (see utils.artifact).
+        """
+        
+        save_artifact(path, self.model, 'random_forest', self.feature_columns, self.thresholds,
+                      params={'max_depth': self.model.max_depth, 'n_estimators': self.model.n_estimators})
+    
+    
+    def load(self, path):
+        """
+        Loads the model, the feature column order and the thresholds from a model artifact.
+        """
+        
+        self.compiled = None
+        self.model, metadata = load_artifact(path)
+        self.feature_columns = metadata['feature_columns']
+        self.thresholds = metadata['thresholds']
+    
+    
+    def add_estimators(self, X_train, y_train, n_estimators):
+        """
+        Grows the already trained forest to n_estimators trees.
+        The existing trees are kept and only the new trees are trained (warm start).
+        With a fixed random_state the result is the same as training n_estimators trees from scratch.
+        """
+        
+        self.model.set_params(warm_start=True, n_estimators=n_estimators)
+        self.fit(X_train, y_train)
+        self.model.set_params(warm_start=False)
+    
+    
+    def staged_predict(self, X_test, n_estimators_values):
+        """
+        Predicts using only the first n trees of the trained forest, for each n in n_estimators_values.
+        Every tree is evaluated only once, so all stages cost as much as a single prediction of the whole forest.
+        
+        :param X_test: features
+        :param n_estimators_values: numbers of trees; each has to be at most the number of trained trees
+        :returns: list of predictions, one for each value in n_estimators_values
+        """
+        
+        n_max = max(n_estimators_values)
+        if n_max > len(self.model.estimators_):
+            raise ValueError("The forest has only " + str(len(self.model.estimators_)) + " trees, " + str(n_max) + " requested.")
+        
+        X_test = np.asarray(order_features(X_test, self.feature_columns), dtype=np.float32)
+        stages = set(n_estimators_values)
+        
+        # running sum of tree predictions; the forest prediction is the mean of its trees
+        y_sum = np.zeros(X_test.shape[0])
+        y_stages = dict()
+        for i, tree in enumerate(self.model.estimators_[:n_max], 1):
+            y_sum += tree.predict(X_test)
+            if i in stages:
+                y_stages[i] = discretize(y_sum / i, self.thresholds)
+        
+        return [y_stages[n_estimators].copy() for n_estimators in n_estimators_values]
     
     
     def set_hyperparams(self, max_depth, n_estimators):
@@ -39,4 +120,5 @@ class RandomForest():
         This will delete the old model and create a new model using the given hyperparams.
         """
         
-        self.model = RandomForestRegressor(max_depth=max_depth, n_estimators=n_estimators)  
\ No newline at end of file
+        self.compiled = None
+        self.model = make_regressor('random_forest', max_depth=max_depth, n_estimators=n_estimators, random_state=self.random_state)  
\ No newline at end of file
@@ -1,7 +1,14 @@
-from sklearn.svm import SVR
-import pickle
+import numpy as np
 
-from .utils.utils import discretize
+from .utils.utils import discretize, feature_columns_of, dense_features, order_features, DISCRETIZATION_THRESHOLDS
+from .utils.artifact import save_artifact, load_artifact
+from .utils.streaming import feature_moments
+
+# solvers of the linear SVM; they work in the primal, so the model is a single weight vector
+LINEAR_SOLVERS = ['liblinear', 'sgd']
+
+# epsilon of the epsilon-insensitive loss; same as the default of sklearn SVR
+EPSILON = 0.1
 
 
 class SupportVectorMachine():
@@ -9,29 +16,135 @@ class SupportVectorMachine():
     Class for the Support Vector Machine (SVM) classifier.
     
     A wrapper for the sklearn implementation.
+    
+    Solvers:
+    - libsvm: sklearn SVR with any kernel; training scales quadratically with the number of samples
+    - liblinear: sklearn LinearSVR; linear kernel only, trained in the primal in linear time
+    - sgd: sklearn SGDRegressor with the epsilon-insensitive loss on standardized features;
+      linear kernel only, supports warm-started sweeps over C (see fit_path)
+    
+    With the linear solvers prediction is a single dot product with the stored weight vector.
     """
     
-    def __init__(self, kernel='linear', C=10.0, save_model=False, use_saved_model=False, model_path='./models/saved_models/svm.pickle'):
+    def __init__(self, kernel='linear', C=10.0, save_model=False, use_saved_model=False, model_path='./models/saved_models/svm', solver='libsvm', random_state=None):
         self.model_path = model_path
         self.save_model = save_model
+        self.feature_columns = None
+        self.thresholds = DISCRETIZATION_THRESHOLDS
+        self.random_state = random_state
+        
+        # fitted models for each C, made by fit_path
+        self.path = dict()
         
         if use_saved_model:
-            with open(self.model_path, 'rb') as file:
-                self.model = pickle.load(file)
+            self.load(self.model_path)
         else:
-            self.model = SVR(kernel=kernel, C=C)
+            self.solver = solver
+            self.set_hyperparams(kernel, C)
     
     
     def fit(self, X_train, y_train):
-        self.model.fit(X_train, y_train)
+        self.feature_columns = feature_columns_of(X_train)
+        X_train = dense_features(X_train)
+        
+        if self.solver == 'sgd':
+            self.model = self._fit_sgd(X_train, y_train, [self.C])[0]
+        else:
+            self.model.fit(X_train, y_train)
         
         if self.save_model:
-            with open(self.model_path, 'wb') as handle:
-                pickle.dump(self.model, handle)
+            self.save(self.model_path)
     
     
     def predict(self, X_test):
-        return discretize(self.model.predict(X_test))
+        X_test = order_features(X_test, self.feature_columns)
+        return discretize(self._predict(self.model, X_test), self.thresholds)
+    
+    
+    def fit_stream(self, chunks, n_epochs=5):
+        """
+        Trains the model on chunks of data without loading the whole table (sgd solver only).
+        The first pass over the chunks computes the feature means and deviations used for standardization,
+        then every epoch is one pass of partial_fit over the chunks.
+        
+        :param chunks: re-iterable source of (X_chunk, y_chunk) tuples (see utils.streaming)
+        :param n_epochs: the number of passes over the data
+        """
+        
+        if self.solver != 'sgd':
+            raise ValueError("Only the sgd solver can be trained on chunks.")
+        
+        mean, scale, n_samples = feature_moments(chunks)
+        scale[scale == 0.0] = 1.0
+        
+        model = self._make_model('linear', self.C, n_samples=n_samples)
+        for epoch in range(n_epochs):
+            for X, y in chunks:
+                model.partial_fit((X - mean) / scale, y)
+        
+        self.model = _unscale(model, mean, scale)
+        self.feature_columns = getattr(chunks, 'feature_columns', None)
+        
+        if self.save_model:
+            self.save(self.model_path)
+    
+    
+    def fit_path(self, X_train, y_train, c_values):
+        """
+        Trains a model for every C in c_values; use staged_predict to predict with them.
+        With the sgd solver each model starts from the weights of the previous (smaller) C.
+        Afterwards the model with the largest C is the current model.
+        """
+        
+        self.feature_columns = feature_columns_of(X_train)
+        X_train = dense_features(X_train)
+        c_values = sorted(set(c_values))
+        
+        if self.solver == 'sgd':
+            models = self._fit_sgd(X_train, y_train, c_values)
+        else:
+            models = list()
+            for c in c_values:
+                model = self._make_model(self.kernel, c)
+                model.fit(X_train, y_train)
+                models.append(model)
+        
+        self.path = dict(zip(c_values, models))
+        self.model = models[-1]
+        self.C = c_values[-1]
+    
+    
+    def staged_predict(self, X_test, c_values):
+        """
+        Predicts with the models trained by fit_path.
+        
+        :returns: list of predictions, one for each value in c_values
+        """
+        
+        X_test = order_features(X_test, self.feature_columns)
+        return [discretize(self._predict(self.path[c], X_test), self.thresholds) for c in c_values]
+    
+    
+    def save(self, path):
+        """
+        Saves the trained model as a model artifact (see utils.artifact).
+        """
+        
+        save_artifact(path, self.model, 'svm', self.feature_columns, self.thresholds,
+                      params={'kernel': self.kernel, 'C': self.C, 'solver': self.solver})
+    
+    
+    def load(self, path):
+        """
+        Loads the model, the feature column order and the thresholds from a model artifact.
+        """
+        
+        self.model, metadata = load_artifact(path)
+        self.feature_columns = metadata['feature_columns']
+        self.thresholds = metadata['thresholds']
+        self.kernel = metadata['params']['kernel']
+        self.C = metadata['params']['C']
+        self.solver = metadata['params'].get('solver', 'libsvm')
     
     
     def set_hyperparams(self, kernel, c):
@@ -40,4 +153,72 @@ class SupportVectorMachine():
         This will delete the old model and create a new model using the given hyperparams.
         """
         
-        self.model = SVR(kernel=kernel, C=c)
\ No newline at end of file
+        self.kernel = kernel
+        self.C = c
+        self.path = dict()
+        self.model = self._make_model(kernel, c)
+    
+    
+    def _make_model(self, kernel, c, n_samples=1):
+        from sklearn.svm import SVR, LinearSVR
+        from sklearn.linear_model import SGDRegressor
+        
+        if self.solver in LINEAR_SOLVERS and kernel != 'linear':
+            raise ValueError("Solver " + self.solver + " supports only the linear kernel.")
+        
+        if self.solver == 'liblinear':
+            return LinearSVR(C=c, epsilon=EPSILON, loss='epsilon_insensitive', dual=True,
+                             max_iter=10000, random_state=self.random_state)
+        if self.solver == 'sgd':
+            # SVR minimizes C * sum(loss) + ||w||^2 / 2, SGD minimizes mean(loss) + alpha * ||w||^2 / 2
+            return SGDRegressor(loss='epsilon_insensitive', epsilon=EPSILON, penalty='l2', alpha=1.0 / (c * n_samples),
+                                random_state=self.random_state)
+        if self.solver == 'libsvm':
+            return SVR(kernel=kernel, C=c)
+        
+        raise ValueError("Unknown solver: " + str(self.solver))
+    
+    
+    def _fit_sgd(self, X_train, y_train, c_values):
+        """
+        Trains an SGD model for every C, each starting from the weights of the previous one.
+        The models are trained on standardized features; afterwards their weights are
+        converted back, so they can be used directly on the original features.
+        """
+        
+        X_train = np.asarray(X_train, dtype=np.float64)
+        y_train = np.asarray(y_train, dtype=np.float64)
+        
+        mean = X_train.mean(axis=0)
+        scale = X_train.std(axis=0)
+        scale[scale == 0.0] = 1.0
+        X_scaled = (X_train - mean) / scale
+        
+        models = list()
+        coef, intercept = None, None
+        for c in c_values:
+            model = self._make_model('linear', c, n_samples=len(X_train))
+            model.fit(X_scaled, y_train, coef_init=coef, intercept_init=intercept)
+            coef, intercept = model.coef_.copy(), model.intercept_.copy()
+            models.append(_unscale(model, mean, scale))
+        
+        return models
+    
+    
+    def _predict(self, model, X_test):
+        if self.solver in LINEAR_SOLVERS:
+            return np.asarray(X_test, dtype=np.float64) @ model.coef_.ravel() + model.intercept_[0]
+        return model.predict(X_test)
+
+
+def _unscale(model, mean, scale):
+    """
+    Converts the weights of a linear model trained on standardized features,
+    so it can be used directly on the original features.
+    """
+    
+    # w_scaled . (x - mean) / scale + b = (w_scaled / scale) . x + (b - w_scaled . mean / scale)
+    model.coef_ = model.coef_ / scale
+    model.intercept_ = model.intercept_ - np.dot(model.coef_, mean)
+    
+    return model
@@ -0,0 +1,270 @@
+"""
+Saving and loading of trained models as model artifacts.
+
+An artifact is a directory containing:
+- metadata.json: backend, feature column order, discretization thresholds and version metadata
+- the model itself, saved in the native format of its backend:
+    - xgboost: model.ubj (XGBoost's binary JSON format, no pickle)
+    - random_forest, svm: model.joblib (numpy arrays are stored separately and can be memory-mapped)
+    - mlp: weights.npz (numpy arrays, loaded without TensorFlow) and model.h5 (Keras HDF5 format, for retraining)
+- a portable export of the model: plain numpy arrays evaluated by a small numpy implementation,
+  independent of the training library (similar in spirit to an ONNX export):
+    - xgboost, random_forest: portable/ directory with the node tables (see tree_inference)
+    - svm: portable.npz with the support vectors and kernel parameters (see svr_inference)
+    - mlp: weights.npz (see mlp_inference)
+
+Artifacts of format version 1 have no portable export and the mlp model is only in model.h5.
+load_artifact still reads them (mlp through Keras); migrate_artifact upgrades them to the current version.
+"""
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+from .utils import DISCRETIZATION_THRESHOLDS
+
+# version of the artifact format, increased on incompatible changes
+ARTIFACT_FORMAT_VERSION = 2
+
+METADATA_FILE = "metadata.json"
+
+MODEL_FILES = {
+    'xgboost': "model.ubj",
+    'random_forest': "model.joblib",
+    'svm': "model.joblib",
+    'mlp': "weights.npz",
+}
+
+# full Keras model saved next to the exported weights of the MLP
+KERAS_MODEL_FILE = "model.h5"
+
+PORTABLE_FILES = {
+    'xgboost': "portable",
+    'random_forest': "portable",
+    'svm': "portable.npz",
+    'mlp': "weights.npz",
+}
+
+# library which trains the model of each backend
+BACKEND_LIBRARIES = {
+    'xgboost': "xgboost",
+    'random_forest': "sklearn",
+    'svm': "sklearn",
+    'mlp': "keras",
+}
+
+
+def _library_version(name):
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+    return getattr(module, '__version__', None)
+
+
+def _column_name(column):
+    # integer column names (e.g. of a dataframe made from an array) are kept, everything else is stored as a string
+    if isinstance(column, (int, np.integer)):
+        return int(column)
+    return str(column)
+
+
+def save_artifact(path, model, backend, feature_columns=None, thresholds=DISCRETIZATION_THRESHOLDS, params=None):
+    """
+    Saves the model as an artifact directory.
+
+    :param path: artifact directory; created if it does not exist
+    :param model: trained model of the backend (XGBRegressor, RandomForestRegressor, SVR or Keras model;
+                  for the mlp backend also an already exported NumpyMLP)
+    :param backend: one of 'xgboost', 'random_forest', 'svm', 'mlp'
+    :param feature_columns: names of the features in the order used for training
+    :param thresholds: thresholds used for converting predictions into readability levels
+    :param params: dictionary of hyperparameters; stored only as information
+    :returns: the metadata dictionary written to metadata.json
+    """
+
+    if backend not in MODEL_FILES:
+        raise ValueError("Unknown backend: " + str(backend))
+
+    os.makedirs(path, exist_ok=True)
+    model_file = MODEL_FILES[backend]
+    model_path = os.path.join(path, model_file)
+
+    if backend == 'xgboost':
+        model.save_model(model_path)
+    elif backend == 'mlp':
+        from .mlp_inference import NumpyMLP
+        if not isinstance(model, NumpyMLP):
+            model.save(os.path.join(path, KERAS_MODEL_FILE))
+            model = NumpyMLP.from_keras(model)
+        model.save(model_path)
+    else:
+        import joblib
+        joblib.dump(model, model_path)
+
+    portable_file = PORTABLE_FILES[backend]
+    if backend != 'mlp':
+        export_portable(model, backend, os.path.join(path, portable_file))
+
+    library = BACKEND_LIBRARIES[backend]
+    metadata = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'backend': backend,
+        'model_file': model_file,
+        'portable_file': portable_file,
+        'feature_columns': None if feature_columns is None else [_column_name(column) for column in feature_columns],
+        'thresholds': [float(threshold) for threshold in thresholds],
+        'params': params or dict(),
+        'versions': {
+            'python': platform.python_version(),
+            'numpy': _library_version("numpy"),
+            library: _library_version(library),
+        },
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    with open(os.path.join(path, METADATA_FILE), 'w') as file:
+        json.dump(metadata, file, indent=2)
+
+    return metadata
+
+
+def load_metadata(path):
+    """
+    Reads metadata.json of the artifact.
+    """
+
+    with open(os.path.join(path, METADATA_FILE)) as file:
+        metadata = json.load(file)
+
+    if metadata['format_version'] > ARTIFACT_FORMAT_VERSION:
+        raise ValueError("Artifact format version " + str(metadata['format_version']) + " is not supported.")
+
+    # version 1 had no portable export
+    metadata.setdefault('portable_file', None)
+
+    return metadata
+
+
+def migrate_artifact(path):
+    """
+    Upgrades an artifact of an older format version in place: exports the portable model
+    (and the weights of the mlp) and rewrites metadata.json. The training library of the backend is needed.
+
+    :param path: artifact directory
+    :returns: the new metadata dictionary
+    """
+
+    metadata = load_metadata(path)
+    if metadata['format_version'] == ARTIFACT_FORMAT_VERSION:
+        return metadata
+
+    model, metadata = load_artifact(path, mmap=False)
+    backend = metadata['backend']
+    model_file = MODEL_FILES[backend]
+    portable_file = PORTABLE_FILES[backend]
+
+    if backend == 'mlp':
+        model.save(os.path.join(path, model_file))
+    else:
+        export_portable(model, backend, os.path.join(path, portable_file))
+
+    metadata.update({
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'model_file': model_file,
+        'portable_file': portable_file,
+    })
+    with open(os.path.join(path, METADATA_FILE), 'w') as file:
+        json.dump(metadata, file, indent=2)
+
+    return metadata
+
+
+def load_artifact(path, mmap=True):
+    """
+    Loads the model from the artifact directory.
+
+    :param path: artifact directory
+    :param mmap: whether the numpy arrays of joblib-saved models are memory-mapped (read-only)
+                 instead of read into memory; workers loading the same artifact then share the pages
+    :returns: model, metadata; for the mlp backend the model is a NumpyMLP
+    """
+
+    metadata = load_metadata(path)
+    backend = metadata['backend']
+    model_path = os.path.join(path, metadata['model_file'])
+
+    if backend == 'xgboost':
+        from xgboost import XGBRegressor
+        model = XGBRegressor()
+        model.load_model(model_path)
+    elif backend == 'mlp' and metadata['model_file'] == KERAS_MODEL_FILE:
+        # version 1 saved only the Keras model
+        from keras.models import load_model
+        from .mlp_inference import NumpyMLP
+        model = NumpyMLP.from_keras(load_model(model_path))
+    elif backend == 'mlp':
+        # only the exported weights are loaded, TensorFlow is not needed
+        from .mlp_inference import NumpyMLP
+        model = NumpyMLP.load(model_path)
+    else:
+        import joblib
+        model = joblib.load(model_path, mmap_mode='r' if mmap else None)
+
+    return model, metadata
+
+
+def export_portable(model, backend, path):
+    """
+    Exports the trained model into the portable numpy format.
+
+    :param model: trained model of the backend (XGBRegressor, RandomForestRegressor or SVR)
+    :param backend: one of 'xgboost', 'random_forest', 'svm'
+    :param path: directory (tree ensembles) or .npz file (svm) to write
+    """
+
+    if backend == 'xgboost':
+        from .tree_inference import CompiledTreeEnsemble
+        CompiledTreeEnsemble.from_xgboost(model.get_booster()).save(path)
+    elif backend == 'random_forest':
+        from .tree_inference import CompiledTreeEnsemble
+        CompiledTreeEnsemble.from_sklearn(model).save(path)
+    elif backend == 'svm':
+        from .svr_inference import NumpySVR
+        NumpySVR.from_sklearn(model).save(path)
+    else:
+        raise ValueError("No portable export for backend: " + str(backend))
+
+
+def load_portable(path, mmap=True, n_threads=1):
+    """
+    Loads the portable export of the model from the artifact directory.
+    Only numpy is needed; none of the training libraries is imported.
+
+    :param path: artifact directory
+    :param mmap: whether the node tables of tree ensembles are memory-mapped
+    :param n_threads: the number of threads used by tree ensembles
+    :returns: model with a predict(X) method, metadata
+    """
+
+    metadata = load_metadata(path)
+    if metadata['portable_file'] is None:
+        raise ValueError("Artifact " + str(path) + " of format version " + str(metadata['format_version'])
+                         + " has no portable export; upgrade it with migrate_artifact.")
+
+    backend = metadata['backend']
+    portable_path = os.path.join(path, metadata['portable_file'])
+
+    if backend in ('xgboost', 'random_forest'):
+        from .tree_inference import CompiledTreeEnsemble
+        model = CompiledTreeEnsemble.load(portable_path, mmap=mmap, n_threads=n_threads)
+    elif backend == 'svm':
+        from .svr_inference import NumpySVR
+        model = NumpySVR.load(portable_path)
+    else:
+        from .mlp_inference import NumpyMLP
+        model = NumpyMLP.load(portable_path)
+
+    return model, metadata
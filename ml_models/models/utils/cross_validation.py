@@ -0,0 +1,127 @@
+"""
+K-fold cross validation engine shared by all model wrappers.
+
+The features are converted only once into a contiguous float32 matrix and the
+fold index arrays are computed only once, so every hyperparameter candidate
+is evaluated on the same folds without copying pandas frames again.
+"""
+import copy
+
+import numpy as np
+
+
+def _fit_and_score(model, X_train, X_test, y_train, y_test, scoring_function):
+    model.fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+
+    return scoring_function(y_test, y_pred)
+
+
+def _fit_and_score_stages(model, X_train, X_test, y_train, y_test, stages, scoring_function):
+    if hasattr(model, 'fit_path'):
+        model.fit_path(X_train, y_train, stages)
+    else:
+        model.fit(X_train, y_train)
+    y_preds = model.staged_predict(X_test, stages)
+
+    return [scoring_function(y_test, y_pred) for y_pred in y_preds]
+
+
+class CrossValidator():
+    """
+    Class for the k-fold cross validation of a model wrapper.
+
+    Any model with fit(X_train, y_train) and predict(X_test) methods can be evaluated
+    (RandomForest, XGBoost, SupportVectorMachine, MultilayerPerceptron).
+    The train and test slices of every fold are cached and reused by all evaluated candidates.
+    """
+
+    def __init__(self, X, y, k=5, shuffle=True, random_state=None, n_jobs=1):
+        """
+        :param X: features; a dataframe or any array-like of shape (n_samples, n_features)
+        :param y: target values
+        :param k: the number of folds
+        :param shuffle: whether to shuffle the data before splitting into folds
+        :param random_state: seed used for shuffling
+        :param n_jobs: the number of folds evaluated in parallel (-1 uses all cores)
+        """
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
+        self.y = np.asarray(y)
+        self.k = k
+        self.n_jobs = n_jobs
+
+        from sklearn.model_selection import KFold
+
+        kf = KFold(n_splits=k, shuffle=shuffle, random_state=random_state)
+        self.folds = [(train_index, test_index) for train_index, test_index in kf.split(self.X)]
+
+        self._fold_data = [None] * k
+
+
+    def fold_data(self, i):
+        """
+        Gets the train and test set for the i-th fold.
+        The slices are made on first use and cached afterwards.
+
+        :param i: index of the fold
+        :returns: X_train, X_test, y_train, y_test
+        """
+
+        if self._fold_data[i] is None:
+            train_index, test_index = self.folds[i]
+            self._fold_data[i] = (self.X[train_index], self.X[test_index],
+                                  self.y[train_index], self.y[test_index])
+
+        return self._fold_data[i]
+
+
+    def fold_scores(self, model, scoring_function):
+        """
+        Trains and evaluates the model on every fold.
+
+        :param model: model wrapper with fit and predict methods
+        :param scoring_function: function of form f(y_true, y_pred)
+        :returns: list with the score for each fold
+        """
+
+        if self.n_jobs == 1:
+            return [_fit_and_score(model, *self.fold_data(i), scoring_function) for i in range(self.k)]
+
+        from joblib import Parallel, delayed
+
+        # every fold gets its own copy of the model since the wrappers keep the fitted model as state
+        return Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_and_score)(copy.deepcopy(model), *self.fold_data(i), scoring_function)
+            for i in range(self.k))
+
+
+    def score(self, model, scoring_function):
+        """
+        Gets the mean score of the model over all folds.
+        """
+
+        return np.mean(self.fold_scores(model, scoring_function))
+
+
+    def staged_scores(self, model, stages, scoring_function):
+        """
+        Evaluates several stages of a model (e.g. numbers of trees) while training it only once per fold.
+        The model has to be set up for the largest stage and have a staged_predict(X_test, stages) method.
+        Models with a fit_path(X_train, y_train, stages) method (e.g. values of C) are trained with it instead of fit.
+
+        :param model: model wrapper with fit (or fit_path) and staged_predict methods
+        :param stages: values passed to staged_predict
+        :param scoring_function: function of form f(y_true, y_pred)
+        :returns: array with the mean score over all folds for each stage
+        """
+
+        if self.n_jobs == 1:
+            scores = [_fit_and_score_stages(model, *self.fold_data(i), stages, scoring_function) for i in range(self.k)]
+        else:
+            from joblib import Parallel, delayed
+
+            scores = Parallel(n_jobs=self.n_jobs)(
+                delayed(_fit_and_score_stages)(copy.deepcopy(model), *self.fold_data(i), stages, scoring_function)
+                for i in range(self.k))
+
+        return np.mean(scores, axis=0)
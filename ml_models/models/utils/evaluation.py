@@ -1,23 +1,197 @@
 """
 Module for evaluation of machine learning models.
+
+evaluation_report computes all metrics and their bootstrap confidence intervals.
+All bootstrap samples are drawn once (in blocks of samples) and all metrics are computed
+for a whole block at once with numpy, so the cost is one resampling pass for all metrics.
 """
 import numpy as np
-from sklearn.metrics import accuracy_score, confusion_matrix, f1_score, r2_score
-from scipy.stats import spearmanr
 
+# the number of elements (bootstrap samples x dataset size) processed at once
+BLOCK_ELEMENTS = 2 ** 22
+
+
+def _midranks(codes, n_codes, idx):
+    """
+    Ranks of the values in every bootstrap sample (ties get the average rank, as in scipy.stats.rankdata).
+
+    :param codes: code of every value (its position among the sorted unique values)
+    :param n_codes: the number of unique values
+    :param idx: matrix of indices, one row for each bootstrap sample
+    :returns: matrix of ranks, the same shape as idx
+    """
+
+    n_samples = len(idx)
+    sample_codes = codes[idx]
+
+    # count of every unique value in every bootstrap sample
+    offsets = n_codes * np.arange(n_samples)[:, None]
+    counts = np.bincount((sample_codes + offsets).ravel(), minlength=n_samples * n_codes).reshape(n_samples, n_codes)
+
+    # values smaller than a value + average position among the equal values
+    midranks = np.cumsum(counts, axis=1) - (counts - 1) / 2.0
+
+    return np.take_along_axis(midranks, sample_codes, axis=1)
+
+
+def _pearson(a, b):
+    """
+    Pearson's correlation coef. of every pair of rows.
+    """
+
+    a = a - a.mean(axis=1, keepdims=True)
+    b = b - b.mean(axis=1, keepdims=True)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.einsum('ij,ij->i', a, b) / np.sqrt(np.einsum('ij,ij->i', a, a) * np.einsum('ij,ij->i', b, b))
+
+
+def _confusion_matrices(true_codes, pred_codes, n_labels, idx):
+    n_samples = len(idx)
+    offsets = n_labels * n_labels * np.arange(n_samples)[:, None]
+    flat = (true_codes[idx] * n_labels + pred_codes[idx] + offsets).ravel()
+
+    return np.bincount(flat, minlength=n_samples * n_labels * n_labels).reshape(n_samples, n_labels, n_labels)
+
+
+def _metrics(data, idx):
+    """
+    Computes all metrics for every bootstrap sample.
+
+    :param data: the arrays prepared by _prepare
+    :param idx: matrix of indices, one row for each bootstrap sample
+    :returns: dict with an array of metric values (first axis is the bootstrap sample) for each metric
+    """
+
+    y_true = data['y_true'][idx]
+    y_pred = data['y_pred'][idx]
+    n = idx.shape[1]
+    metrics = dict()
+
+    # Spearman's correlation coef. is Pearson's correlation coef. of the ranks
+    metrics['spearman'] = _pearson(_midranks(data['true_ranks'], data['n_true_values'], idx),
+                                   _midranks(data['pred_ranks'], data['n_pred_values'], idx))
+
+    residual = ((y_true - y_pred) ** 2).sum(axis=1)
+    total = ((y_true - y_true.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['r2'] = 1.0 - residual / total
+
+    labels = data['labels']
+    if labels is not None:
+        cm = _confusion_matrices(data['true_labels'], data['pred_labels'], len(labels), idx)
+        metrics['confusion_matrix'] = cm
+
+        tp = np.einsum('ijj->ij', cm)
+        metrics['accuracy'] = tp.sum(axis=1) / n
+
+        # prediction at most one level away from the true level
+        adjacent = np.abs(labels[:, None] - labels[None, :]) <= 1
+        metrics['adjacent_accuracy'] = (cm * adjacent).sum(axis=(1, 2)) / n
+
+        # F1 of every level; the average is over levels which appear in the sample (as in sklearn)
+        fp = cm.sum(axis=1) - tp
+        fn = cm.sum(axis=2) - tp
+        denominator = 2 * tp + fp + fn
+        f1 = np.divide(2 * tp, denominator, out=np.zeros(tp.shape), where=denominator > 0)
+        metrics['macro_f1'] = f1.sum(axis=1) / (denominator > 0).sum(axis=1)
 
-def print_metrics(y_true, y_pred):
+    return metrics
+
+
+def _prepare(y_true, y_pred):
+    y_true = np.asarray(y_true, dtype=np.float64).ravel()
+    y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+
+    if len(y_true) != len(y_pred):
+        raise ValueError("y_true and y_pred have different lengths.")
+
+    true_values, true_ranks = np.unique(y_true, return_inverse=True)
+    pred_values, pred_ranks = np.unique(y_pred, return_inverse=True)
+
+    data = {
+        'y_true': y_true,
+        'y_pred': y_pred,
+        'true_ranks': true_ranks.ravel(),
+        'pred_ranks': pred_ranks.ravel(),
+        'n_true_values': len(true_values),
+        'n_pred_values': len(pred_values),
+        'labels': None,
+    }
+
+    # classification metrics only for predicted levels (not for continuous scores)
+    if np.all(np.mod(true_values, 1) == 0) and np.all(np.mod(pred_values, 1) == 0):
+        labels = np.union1d(true_values, pred_values)
+        data['labels'] = labels
+        data['true_labels'] = np.searchsorted(labels, y_true)
+        data['pred_labels'] = np.searchsorted(labels, y_pred)
+
+    return data
+
+
+def evaluation_report(y_true, y_pred, n_bootstrap=1000, alpha=0.05, random_state=None):
+    """
+    Evaluates the predictions.
+
+    Metrics:
+    spearman: Spearman's correlation coef.
+    r2: coef. of determination (R^2)
+    accuracy: percentage of correctly predicted levels
+    adjacent_accuracy: percentage of predictions at most one level away from the true level
+    macro_f1: F1 score averaged over levels
+    confusion_matrix: rows are true levels, columns are predicted levels (the levels are in 'labels')
+
+    The classification metrics are given only if both y_true and y_pred contain whole numbers (levels).
+
+    :param y_true: true levels
+    :param y_pred: predicted levels (or continuous scores, e.g. of a readability formula)
+    :param n_bootstrap: the number of bootstrap samples for the confidence intervals; 0 for no intervals
+    :param alpha: the intervals are (1 - alpha) percentile intervals
+    :param random_state: seed of the bootstrap sampling
+    :returns: dict with a dict for each metric, containing the value and the confidence interval (ci; low, high)
+    """
+
+    data = _prepare(y_true, y_pred)
+    n = len(data['y_true'])
+
+    values = _metrics(data, np.arange(n)[None, :])
+    report = {name: {'value': value[0], 'ci': None} for name, value in values.items()}
+    if data['labels'] is not None:
+        report['confusion_matrix']['labels'] = data['labels']
+
+    if n_bootstrap > 0:
+        random = np.random.RandomState(random_state)
+        block_size = max(1, BLOCK_ELEMENTS // n)
+
+        samples = {name: list() for name in values}
+        for start in range(0, n_bootstrap, block_size):
+            idx = random.randint(0, n, size=(min(block_size, n_bootstrap - start), n))
+            for name, value in _metrics(data, idx).items():
+                samples[name].append(value)
+
+        for name in values:
+            low, high = np.nanpercentile(np.concatenate(samples[name]), [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+            report[name]['ci'] = (low, high)
+
+    return report
+
+
+def print_metrics(y_true, y_pred, report=None):
+    """
+    Prints Spearman's correlation coef. and R^2 of the predictions.
+
+    :param report: report made by evaluation_report; computed (without the confidence intervals) if not given
+    """
+
+    if report is None:
+        report = evaluation_report(y_true, y_pred, n_bootstrap=0)
     
     print("================================================")
-    print("Spearman's correlation coef: " + str(spearmanr(y_true, y_pred)[0]))
+    print("Spearman's correlation coef: " + str(report['spearman']['value']))
     print("================================================")
     
     print("-----------")
-    print("R^2 = " + str(r2_score(y_true, y_pred)))
-    print("R = " + str(np.sqrt(r2_score(y_true, y_pred))))
+    print("R^2 = " + str(report['r2']['value']))
+    print("R = " + str(np.sqrt(report['r2']['value'])))
     print("-----------")
-    
-  
-    
-    
     
\ No newline at end of file
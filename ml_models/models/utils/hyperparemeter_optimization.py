@@ -1,44 +1,42 @@
 """
 Functions for cross validation.
 """
-from scipy.stats import spearmanr
-from sklearn.model_selection import KFold
-import numpy as np
+from .cross_validation import CrossValidator
 
 
-def grid_search_cv_for_ensembles(model, max_depth_values, n_estimators_values, X, y, scoring_function, k=5, verbose=0):
+def grid_search_cv_for_ensembles(model, max_depth_values, n_estimators_values, X, y, scoring_function, k=5, verbose=0, n_jobs=1, cv=None):
     """
     Performs the grid search for n_estimators and max_depth hyperparameters. 
     For each value in the grid does the k-folded cross validation.
+    All values in the grid are evaluated on the same folds.
+    
+    If the model supports staged prediction (RandomForest, XGBoost), only the largest
+    n_estimators value is trained for each max_depth and the smaller values are scored
+    using the first n_estimators trees of it.
+
+    :param cv: CrossValidator to reuse; if not given, one is made from X, y and k
     """
+
+    if cv is None:
+        cv = CrossValidator(X, y, k=k, n_jobs=n_jobs)
     
     best_score = 0.0
     best_n_estimators = 1
     best_max_depth = 1
     
     for max_depth in max_depth_values: 
-        for n_estimators in n_estimators_values:
             
-            kf = KFold(n_splits=k, random_state=None, shuffle=True)
-
-            fold = 1
-            scores = []
-            for train_index, test_index in kf.split(X):
-
-                # get train and test set for the i-th fold
-                X_train, X_test = X.loc[train_index], X.loc[test_index]
-                y_train, y_test = y[train_index], y[test_index]
-
-                # train and predict
+        if hasattr(model, 'staged_predict'):
+            # train the largest ensemble once per fold and evaluate its smaller prefixes
+            model.set_hyperparams(max_depth, max(n_estimators_values))
+            scores = cv.staged_scores(model, n_estimators_values, scoring_function)
+        else:
+            scores = list()
+            for n_estimators in n_estimators_values:
                 model.set_hyperparams(max_depth, n_estimators)
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-
-                scores.append(scoring_function(y_test, y_pred))
+                scores.append(cv.score(model, scoring_function))
 
-                fold += 1
-              
-            score = np.mean(scores)
+        for n_estimators, score in zip(n_estimators_values, scores):
             
             if verbose > 0:
                 print("score=" + str(score) + " | max_depth=" + str(max_depth) + " n_estimators=" + str(n_estimators))
@@ -51,33 +49,33 @@ def grid_search_cv_for_ensembles(model, max_depth_values, n_estimators_values, X
     return best_max_depth, best_n_estimators
 
 
-def find_best_C(model, c_values, X, y, scoring_function, k=5, verbose=0):
+def find_best_C(model, c_values, X, y, scoring_function, k=5, verbose=0, n_jobs=1, cv=None):
+    """
+    Finds the best C hyperparameter of the linear SVM using k-folded cross validation.
+    All values of C are evaluated on the same folds.
+    
+    With a linear solver (liblinear, sgd) the whole path of C values is trained at once per fold
+    (warm-started with sgd) and prediction is a dot product.
+
+    :param cv: CrossValidator to reuse; if not given, one is made from X, y and k
+    """
+
+    if cv is None:
+        cv = CrossValidator(X, y, k=k, n_jobs=n_jobs)
     
     best_score = 0.0
     best_c = 1.0
     
-    for c in c_values: 
-            
-        kf = KFold(n_splits=k, random_state=None, shuffle=True)
-
-        fold = 1
-        scores = []
-        for train_index, test_index in kf.split(X):
-
-            # get train and test set for the i-th fold
-            X_train, X_test = X.loc[train_index], X.loc[test_index]
-            y_train, y_test = y[train_index], y[test_index]
-
-            # train and predict
+    if getattr(model, 'solver', 'libsvm') != 'libsvm':
+        model.set_hyperparams('linear', max(c_values))
+        scores = cv.staged_scores(model, c_values, scoring_function)
+    else:
+        scores = list()
+        for c in c_values:
             model.set_hyperparams('linear', c)
-            model.fit(X_train, y_train)
-            y_pred = model.predict(X_test)
-
-            scores.append(scoring_function(y_test, y_pred))
-
-            fold += 1
-
-        score = np.mean(scores)
+            scores.append(cv.score(model, scoring_function))
+            
+    for c, score in zip(c_values, scores):
 
         if verbose > 0:
             print("score=" + str(score) + " | C=" + str(c))
@@ -0,0 +1,120 @@
+"""
+Pure numpy inference for the Multilayer Perceptron.
+
+The weights of the trained Keras model are exported into a small .npz file.
+Prediction is then a forward pass through the dense layers in numpy,
+so serving does not need to import TensorFlow.
+"""
+import numpy as np
+
+
+def _relu(x):
+    return np.maximum(x, 0.0, out=x)
+
+
+def _linear(x):
+    return x
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+ACTIVATIONS = {
+    'relu': _relu,
+    'linear': _linear,
+    'tanh': np.tanh,
+    'sigmoid': _sigmoid,
+    'softmax': _softmax,
+}
+
+
+class NumpyMLP():
+    """
+    Class for the forward pass of a trained dense network in numpy.
+    Dropout layers are only used in training, so they are left out.
+    """
+
+    def __init__(self, weights, biases, activations):
+        """
+        :param weights: list of weight matrices, one (n_inputs, n_outputs) matrix for each dense layer
+        :param biases: list of bias vectors, one for each dense layer
+        :param activations: list of activation names, one for each dense layer
+        """
+        for activation in activations:
+            if activation not in ACTIVATIONS:
+                raise ValueError("Unsupported activation: " + str(activation))
+
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+
+
+    @classmethod
+    def from_keras(cls, model):
+        """
+        Exports the dense layers of a trained Keras model.
+        """
+
+        weights, biases, activations = list(), list(), list()
+        for layer in model.layers:
+            if layer.__class__.__name__ == 'Dropout':
+                continue
+            if layer.__class__.__name__ != 'Dense':
+                raise ValueError("Unsupported layer: " + layer.__class__.__name__)
+
+            w, b = layer.get_weights()
+            weights.append(w)
+            biases.append(b)
+            activations.append(layer.get_config()['activation'])
+
+        return cls(weights, biases, activations)
+
+
+    def predict(self, X):
+        """
+        Computes the output of the network for every row of X.
+
+        :param X: features; a dataframe or any array-like of shape (n_samples, n_features)
+        :returns: numpy array of shape (n_samples, n_outputs)
+        """
+
+        h = np.asarray(X, dtype=np.float32)
+        for w, b, activation in zip(self.weights, self.biases, self.activations):
+            h = h @ w
+            h += b
+            h = ACTIVATIONS[activation](h)
+
+        return h
+
+
+    def save(self, path):
+        """
+        Saves the weights into a .npz file.
+        """
+
+        arrays = {'activations': np.array(self.activations)}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays['weights_' + str(i)] = w
+            arrays['biases_' + str(i)] = b
+
+        np.savez(path, **arrays)
+
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the weights saved by save.
+        """
+
+        with np.load(path, allow_pickle=False) as arrays:
+            activations = [str(activation) for activation in arrays['activations']]
+            weights = [arrays['weights_' + str(i)] for i in range(len(activations))]
+            biases = [arrays['biases_' + str(i)] for i in range(len(activations))]
+
+        return cls(weights, biases, activations)
@@ -0,0 +1,96 @@
+"""
+Sources of feature chunks for out-of-core (minibatch) training.
+
+A chunk source can be iterated over many times (once per epoch or pass) and yields
+tuples (X_chunk, y_chunk), where X_chunk is a float32 matrix. Only one chunk is in memory at a time.
+"""
+import numpy as np
+
+
+class CsvChunks():
+    """
+    Chunks of a feature table saved as CSV (e.g. weebit_train_with_features.csv).
+    """
+
+    def __init__(self, path, chunksize=10000, target_column='Level', drop_columns=('Text',), feature_columns=None):
+        """
+        :param path: path to the CSV file; the first column is the index
+        :param chunksize: the number of rows in a chunk
+        :param target_column: name of the column with the readability level
+        :param drop_columns: columns which are neither features nor the target
+        :param feature_columns: feature columns in the wanted order; all remaining columns if not given
+        """
+        self.path = path
+        self.chunksize = chunksize
+        self.target_column = target_column
+        self.drop_columns = list(drop_columns)
+        self.feature_columns = feature_columns
+
+
+    def __iter__(self):
+        import pandas as pd
+
+        for df in pd.read_csv(self.path, index_col=0, chunksize=self.chunksize):
+            if self.feature_columns is None:
+                self.feature_columns = [column for column in df.columns
+                                        if column != self.target_column and column not in self.drop_columns]
+
+            X = np.ascontiguousarray(df[self.feature_columns], dtype=np.float32)
+            y = df[self.target_column].to_numpy(dtype=np.float32)
+            yield X, y
+
+
+class ArrayChunks():
+    """
+    Chunks of feature and target arrays, e.g. .npy files opened with np.load(path, mmap_mode='r').
+    Only the rows of the current chunk are read from disk.
+    """
+
+    def __init__(self, X, y, chunksize=10000, feature_columns=None):
+        self.X = X
+        self.y = y
+        self.chunksize = chunksize
+        self.feature_columns = feature_columns
+
+
+    @classmethod
+    def from_npy(cls, X_path, y_path, chunksize=10000, feature_columns=None):
+        return cls(np.load(X_path, mmap_mode='r'), np.load(y_path, mmap_mode='r'), chunksize, feature_columns)
+
+
+    def __iter__(self):
+        for start in range(0, len(self.X), self.chunksize):
+            end = start + self.chunksize
+            yield np.ascontiguousarray(self.X[start:end], dtype=np.float32), np.asarray(self.y[start:end], dtype=np.float32)
+
+
+def feature_moments(chunks):
+    """
+    Computes the mean and standard deviation of every feature in one pass over the chunks
+    (chunk statistics are merged with Chan's parallel algorithm, which is numerically stable).
+
+    :returns: mean, std, number of samples
+    """
+
+    n = 0
+    mean = None
+    m2 = None
+    for X, _ in chunks:
+        X = X.astype(np.float64)
+        n_chunk = len(X)
+        if n_chunk == 0:
+            continue
+        mean_chunk = X.mean(axis=0)
+        m2_chunk = ((X - mean_chunk) ** 2).sum(axis=0)
+
+        if mean is None:
+            n, mean, m2 = n_chunk, mean_chunk, m2_chunk
+            continue
+
+        delta = mean_chunk - mean
+        n_total = n + n_chunk
+        mean = mean + delta * n_chunk / n_total
+        m2 = m2 + m2_chunk + delta ** 2 * n * n_chunk / n_total
+        n = n_total
+
+    return mean, np.sqrt(m2 / n), n
@@ -0,0 +1,115 @@
+"""
+Pure numpy inference for the Support Vector Machine (sklearn SVR).
+
+The support vectors, dual coefficients and kernel parameters of the trained model
+are exported into a .npz file and the decision function is evaluated in numpy.
+For the linear kernel the support vectors are collapsed into a single weight vector,
+so prediction is one dot product per sample.
+"""
+import numpy as np
+
+KERNELS = ['linear', 'rbf', 'poly', 'sigmoid']
+
+
+class NumpySVR():
+    """
+    Class for the decision function of a trained SVR in numpy.
+    """
+
+    def __init__(self, kernel, support_vectors, dual_coef, intercept, gamma=1.0, coef0=0.0, degree=3, coef=None):
+        """
+        :param kernel: one of 'linear', 'rbf', 'poly', 'sigmoid'
+        :param support_vectors: matrix of shape (n_support_vectors, n_features)
+        :param dual_coef: vector of dual coefficients, one for each support vector
+        :param intercept: the intercept of the decision function
+        :param gamma, coef0, degree: kernel parameters (as in sklearn)
+        :param coef: weight vector of the linear kernel; computed from the support vectors if not given
+        """
+        if kernel not in KERNELS:
+            raise ValueError("Unsupported kernel: " + str(kernel))
+
+        self.kernel = kernel
+        self.support_vectors = np.ascontiguousarray(support_vectors, dtype=np.float64)
+        self.dual_coef = np.ascontiguousarray(dual_coef, dtype=np.float64).ravel()
+        self.intercept = float(intercept)
+        self.gamma = float(gamma)
+        self.coef0 = float(coef0)
+        self.degree = int(degree)
+
+        if kernel == 'linear' and coef is None:
+            coef = self.dual_coef @ self.support_vectors
+        self.coef = None if coef is None else np.ascontiguousarray(coef, dtype=np.float64).ravel()
+
+        if kernel == 'rbf':
+            self._sv_sq_norms = np.einsum('ij,ij->i', self.support_vectors, self.support_vectors)
+
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Exports a trained sklearn SVR, or a linear model with coef_ and intercept_ (LinearSVR, SGDRegressor).
+        """
+
+        if not hasattr(model, 'support_vectors_'):
+            coef = np.ravel(model.coef_)
+            return cls('linear', np.zeros((0, len(coef))), np.zeros(0), np.ravel(model.intercept_)[0], coef=coef)
+
+        return cls(model.kernel, model.support_vectors_, model.dual_coef_, model.intercept_[0],
+                   gamma=model._gamma, coef0=model.coef0, degree=model.degree)
+
+
+    def predict(self, X):
+        """
+        Evaluates the decision function for every row of X.
+
+        :param X: features; a dataframe or any array-like of shape (n_samples, n_features)
+        :returns: numpy array with a prediction for each sample
+        """
+
+        X = np.asarray(X, dtype=np.float64)
+
+        if self.kernel == 'linear':
+            return X @ self.coef + self.intercept
+
+        dot = X @ self.support_vectors.T
+        if self.kernel == 'rbf':
+            x_sq_norms = np.einsum('ij,ij->i', X, X)
+            sq_distances = np.maximum(x_sq_norms[:, None] - 2.0 * dot + self._sv_sq_norms[None, :], 0.0)
+            k = np.exp(-self.gamma * sq_distances)
+        elif self.kernel == 'poly':
+            k = (self.gamma * dot + self.coef0) ** self.degree
+        else:
+            k = np.tanh(self.gamma * dot + self.coef0)
+
+        return k @ self.dual_coef + self.intercept
+
+
+    def save(self, path):
+        """
+        Saves the model into a .npz file.
+        """
+
+        arrays = {
+            'kernel': np.array(self.kernel),
+            'support_vectors': self.support_vectors,
+            'dual_coef': self.dual_coef,
+            'params': np.array([self.intercept, self.gamma, self.coef0, self.degree]),
+        }
+        if self.coef is not None:
+            arrays['coef'] = self.coef
+
+        np.savez(path, **arrays)
+
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the model saved by save.
+        """
+
+        with np.load(path, allow_pickle=False) as arrays:
+            intercept, gamma, coef0, degree = arrays['params']
+            coef = arrays['coef'] if 'coef' in arrays.files else None
+
+            return cls(str(arrays['kernel']), arrays['support_vectors'], arrays['dual_coef'], intercept,
+                       gamma=gamma, coef0=coef0, degree=degree, coef=coef)
@@ -0,0 +1,285 @@
+"""
+Compiled inference for tree ensembles (RandomForest and XGBoost).
+
+The trained trees are converted into flat node tables (numpy arrays) and the whole
+batch is pushed through all trees with vectorized numpy indexing, one tree level per step.
+This avoids the per-call overhead of the sklearn and xgboost Python APIs,
+which dominates for small batches.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# objectives whose prediction is the raw sum of leaf values (identity link)
+XGBOOST_IDENTITY_OBJECTIVES = ['reg:squarederror', 'reg:absoluteerror', 'reg:pseudohubererror']
+
+# upper limit on the number of (tree, sample) pairs traversed at once; bounds the memory used
+MAX_BLOCK_SIZE = 2 ** 20
+
+TABLES = ['feature', 'threshold', 'left', 'right', 'default_left', 'value', 'roots', 'depths']
+
+
+class CompiledTreeEnsemble():
+    """
+    Class for the tree ensemble stored as flat node tables.
+
+    The nodes of all trees are stored in arrays indexed by a global node id.
+    Leaves point to themselves, so a sample which reached a leaf stays there
+    while the deeper trees are still being traversed.
+
+    Prediction is base_score + scale * (sum of the leaf values of all trees).
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, depths,
+                 base_score=0.0, scale=1.0, strict=False, n_features=None, n_threads=1):
+        """
+        :param feature: feature index of every node
+        :param threshold: split threshold of every node
+        :param left: id of the left child of every node (node id itself for leaves)
+        :param right: id of the right child of every node (node id itself for leaves)
+        :param default_left: for every node, whether missing values (NaN) go to the left child
+        :param value: leaf value of every node
+        :param roots: id of the root node of every tree
+        :param depths: depth of every tree
+        :param base_score: value added to the sum of the trees
+        :param scale: value by which the sum of the trees is multiplied
+        :param strict: if True, a sample goes left when x < threshold (xgboost), otherwise when x <= threshold (sklearn)
+        :param n_features: the number of features the ensemble was trained on
+        :param n_threads: the number of threads among which the trees are divided
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.depths = depths
+
+        self.base_score = base_score
+        self.scale = scale
+        self.strict = strict
+        self.n_features = n_features
+        self.n_threads = n_threads
+
+        self._leaves = None
+
+
+    @classmethod
+    def from_sklearn(cls, model, n_threads=1):
+        """
+        Compiles a trained sklearn forest (e.g. RandomForestRegressor).
+        """
+
+        tables = {name: list() for name in TABLES}
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            tables['feature'].append(np.where(is_leaf, 0, tree.feature))
+            tables['threshold'].append(tree.threshold)
+            tables['left'].append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            tables['right'].append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            # trees trained on data with missing values know where to send them (newer sklearn versions)
+            missing_go_to_left = getattr(tree, 'missing_go_to_left', None)
+            if missing_go_to_left is None:
+                missing_go_to_left = np.zeros(tree.node_count, dtype=bool)
+            tables['default_left'].append(missing_go_to_left)
+            tables['value'].append(tree.value[:, 0, 0])
+            tables['roots'].append([offset])
+            tables['depths'].append([tree.max_depth])
+
+            offset += tree.node_count
+
+        return cls(*_concatenate(tables, threshold_dtype=np.float64),
+                   base_score=0.0, scale=1.0 / len(model.estimators_), strict=False,
+                   n_features=model.n_features_in_, n_threads=n_threads)
+
+
+    @classmethod
+    def from_xgboost(cls, booster, n_threads=1):
+        """
+        Compiles a trained xgboost Booster (e.g. XGBRegressor().get_booster()).
+        Only tree boosters with an identity link objective are supported.
+        """
+
+        learner = json.loads(bytes(booster.save_raw(raw_format='json')))['learner']
+
+        objective = learner['objective']['name']
+        if objective not in XGBOOST_IDENTITY_OBJECTIVES:
+            raise ValueError("Objective " + objective + " is not supported.")
+        if learner['gradient_booster']['name'] != 'gbtree':
+            raise ValueError("Only the gbtree booster is supported.")
+
+        tables = {name: list() for name in TABLES}
+        offset = 0
+        for tree in learner['gradient_booster']['model']['trees']:
+            children_left = np.asarray(tree['left_children'], dtype=np.int64)
+            children_right = np.asarray(tree['right_children'], dtype=np.int64)
+            n_nodes = len(children_left)
+            node_ids = np.arange(n_nodes)
+            is_leaf = children_left == -1
+
+            # for leaves, xgboost stores the leaf value in split_conditions
+            split_conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+
+            tables['feature'].append(np.where(is_leaf, 0, tree['split_indices']))
+            tables['threshold'].append(split_conditions)
+            tables['left'].append(np.where(is_leaf, node_ids, children_left) + offset)
+            tables['right'].append(np.where(is_leaf, node_ids, children_right) + offset)
+            tables['default_left'].append(np.asarray(tree['default_left'], dtype=bool))
+            tables['value'].append(np.where(is_leaf, split_conditions, 0.0))
+            tables['roots'].append([offset])
+            tables['depths'].append([_tree_depth(children_left, children_right)])
+
+            offset += n_nodes
+
+        base_score = _parse_base_score(learner['learner_model_param']['base_score'])
+
+        return cls(*_concatenate(tables, threshold_dtype=np.float32),
+                   base_score=base_score, scale=1.0, strict=True,
+                   n_features=int(learner['learner_model_param']['num_feature']), n_threads=n_threads)
+
+
+    def predict(self, X):
+        """
+        Predicts the (continuous) output of the ensemble for every row of X.
+
+        :param X: features; a dataframe or any array-like of shape (n_samples, n_features)
+        :returns: numpy array with a prediction for each sample
+        """
+
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        n_trees = len(self.roots)
+        n_threads = max(1, min(self.n_threads, n_trees))
+        bounds = np.linspace(0, n_trees, n_threads + 1).astype(int)
+
+        if n_threads == 1:
+            tree_sum = self._predict_trees(X, 0, n_trees)
+        else:
+            with ThreadPoolExecutor(max_workers=n_threads) as executor:
+                sums = executor.map(lambda i: self._predict_trees(X, bounds[i], bounds[i + 1]), range(n_threads))
+                tree_sum = np.sum(list(sums), axis=0)
+
+        return self.base_score + self.scale * tree_sum
+
+
+    def _predict_trees(self, X, start, end):
+        """
+        Sum of the leaf values of trees start..end-1 for every sample.
+        """
+
+        n_samples, n_features = X.shape
+        X_flat = X.ravel()
+        if not self.strict:
+            # sklearn compares the float32 features with float64 thresholds
+            X_flat = X_flat.astype(np.float64)
+        is_nan = np.isnan(X_flat)
+        has_nan = is_nan.any()
+        is_leaf = self._is_leaf()
+
+        tree_sum = np.zeros(n_samples)
+        block = max(1, MAX_BLOCK_SIZE // max(n_samples, 1))
+        row_offsets = np.arange(n_samples) * n_features
+
+        for block_start in range(start, end, block):
+            block_end = min(block_start + block, end)
+            n_block = block_end - block_start
+
+            # current node and row offset of every (tree, sample) pair
+            nodes = np.repeat(self.roots[block_start:block_end], n_samples)
+            rows = np.tile(row_offsets, n_block)
+
+            # only pairs which did not reach a leaf yet are moved down the tree
+            active = np.flatnonzero(~is_leaf[nodes])
+            while active.size:
+                active_nodes = nodes[active]
+                x_index = rows[active] + self.feature[active_nodes]
+                x = X_flat[x_index]
+                threshold = self.threshold[active_nodes]
+
+                if self.strict:
+                    go_left = x < threshold
+                else:
+                    go_left = x <= threshold
+                if has_nan:
+                    go_left = np.where(is_nan[x_index], self.default_left[active_nodes], go_left)
+
+                active_nodes = np.where(go_left, self.left[active_nodes], self.right[active_nodes])
+                nodes[active] = active_nodes
+                active = active[~is_leaf[active_nodes]]
+
+            tree_sum += self.value[nodes].reshape(n_block, n_samples).sum(axis=0)
+
+        return tree_sum
+
+
+    def _is_leaf(self):
+        if self._leaves is None:
+            self._leaves = self.left == np.arange(len(self.left))
+        return self._leaves
+
+
+    def save(self, path):
+        """
+        Saves the node tables into a directory, one .npy file per table,
+        so they can be loaded as memory-mapped arrays.
+        """
+
+        os.makedirs(path, exist_ok=True)
+        for name in TABLES:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+
+        params = {'base_score': self.base_score, 'scale': self.scale,
+                  'strict': self.strict, 'n_features': self.n_features}
+        with open(os.path.join(path, "params.json"), 'w') as file:
+            json.dump(params, file)
+
+
+    @classmethod
+    def load(cls, path, mmap=True, n_threads=1):
+        """
+        Loads the node tables saved by save.
+
+        :param mmap: whether the tables are memory-mapped (read-only) instead of read into memory
+        """
+
+        with open(os.path.join(path, "params.json")) as file:
+            params = json.load(file)
+
+        tables = [np.load(os.path.join(path, name + ".npy"), mmap_mode='r' if mmap else None) for name in TABLES]
+
+        return cls(*tables, n_threads=n_threads, **params)
+
+
+def _concatenate(tables, threshold_dtype):
+    return (np.concatenate(tables['feature']).astype(np.int32),
+            np.concatenate(tables['threshold']).astype(threshold_dtype),
+            np.concatenate(tables['left']).astype(np.int32),
+            np.concatenate(tables['right']).astype(np.int32),
+            np.concatenate(tables['default_left']).astype(bool),
+            np.concatenate(tables['value']).astype(np.float64),
+            np.concatenate(tables['roots']).astype(np.int32),
+            np.concatenate(tables['depths']).astype(np.int32))
+
+
+def _tree_depth(children_left, children_right):
+    depth = 0
+    level = [0]
+    while True:
+        level = [child for node in level for child in (children_left[node], children_right[node]) if child != -1]
+        if not level:
+            return depth
+        depth += 1
+
+
+def _parse_base_score(base_score):
+    # stored as a string, e.g. "5E-1", and as a list of strings, e.g. "[5E-1]", in newer xgboost versions
+    return float(base_score.strip("[]").split(",")[0])
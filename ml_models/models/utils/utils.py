@@ -1,24 +1,72 @@
 """
 Machine learning models utility functions.
+
+The training libraries (sklearn, xgboost) aren't imported by the model modules; make_regressor and
+the methods which need them import them when they are first used, so importing the models is fast.
 """
+import importlib
+
 import numpy as np
 
+# predictions below the first threshold are level 0, between the first and the second level 1, etc.
+DISCRETIZATION_THRESHOLDS = (0.5, 1.5, 2.5, 3.5)
+
+# module and class of the regressor of each tree backend
+REGRESSORS = {
+    'random_forest': ("sklearn.ensemble", "RandomForestRegressor"),
+    'xgboost': ("xgboost", "XGBRegressor"),
+}
 
-def discretize(y_pred):
+
+def discretize(y_pred, thresholds=DISCRETIZATION_THRESHOLDS):
     """
     Converts the predicted results from a continuous variable to five readability levels.
+    The conversion is done in place.
     """
     
-    for i in range(len(y_pred)):    
-        if y_pred[i] < 0.5:
-            y_pred[i] = 0.0
-        elif y_pred[i] < 1.5:
-            y_pred[i] = 1.0
-        elif y_pred[i] < 2.5:
-            y_pred[i] = 2.0
-        elif y_pred[i] < 3.5:
-            y_pred[i] = 3.0
-        else:
-            y_pred[i] = 4.0
+    y_pred[:] = np.digitize(y_pred, thresholds)
             
-    return y_pred
\ No newline at end of file
+    return y_pred
+
+
+def feature_columns_of(X):
+    """
+    Gets the names of the feature columns if X has them (dataframe, QuantizedFeatures with columns), otherwise None.
+    """
+
+    columns = getattr(X, 'columns', None)
+    if columns is not None:
+        return list(columns)
+    return None
+
+
+def dense_features(X):
+    """
+    Converts quantized features (objects with a dequantize method, e.g. features.feature_matrix.QuantizedFeatures)
+    into a float32 matrix. Other inputs are returned unchanged.
+    """
+
+    if hasattr(X, 'dequantize'):
+        return X.dequantize()
+    return X
+
+
+def order_features(X, feature_columns):
+    """
+    Reorders the columns of X (dataframe or QuantizedFeatures with column names) into the order used for training.
+    Inputs without column names (and all inputs when the training order is unknown) aren't reordered,
+    their columns have to be in the training order; quantized features are dequantized.
+    """
+
+    if feature_columns is not None and getattr(X, 'columns', None) is not None:
+        X = X[feature_columns]
+    return dense_features(X)
+
+
+def make_regressor(backend, **params):
+    """
+    Makes a new regressor of the backend ('random_forest' or 'xgboost') with the given hyperparameters.
+    """
+
+    module, name = REGRESSORS[backend]
+    return getattr(importlib.import_module(module), name)(**params)
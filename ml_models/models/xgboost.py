@@ -1,7 +1,8 @@
-from xgboost import XGBRegressor
-import pickle
+import os
 
-from .utils.utils import discretize
+from .utils.utils import discretize, feature_columns_of, dense_features, order_features, make_regressor, DISCRETIZATION_THRESHOLDS
+from .utils.artifact import save_artifact, load_artifact
+from .utils.tree_inference import CompiledTreeEnsemble
 
 
 class XGBoost():
@@ -11,27 +12,135 @@ class XGBoost():
     A wrapper for the xgboost implemenation.
     """
     
-    def __init__(self, max_depth=30, n_estimators=200, save_model=False, use_saved_model=False, model_path='./models/saved_models/xgboost.pickle'):
+    def __init__(self, max_depth=30, n_estimators=200, save_model=False, use_saved_model=False, model_path='./models/saved_models/xgboost', random_state=None):
         self.model_path = model_path
         self.save_model = save_model
+        self.random_state = random_state
+        self.feature_columns = None
+        self.thresholds = DISCRETIZATION_THRESHOLDS
+        self.compiled = None
         
         if use_saved_model:
-            with open(self.model_path, 'rb') as file:
-                self.model = pickle.load(file)
+            self.load(self.model_path)
         else:
-            self.model = xgboost = XGBRegressor(max_depth=max_depth, n_estimators=n_estimators, objective="reg:squarederror")  
+            self.model = make_regressor('xgboost', max_depth=max_depth, n_estimators=n_estimators, objective="reg:squarederror", random_state=random_state)  
     
     
     def fit(self, X_train, y_train):
+        self.compiled = None
+        self.feature_columns = feature_columns_of(X_train)
+        X_train = dense_features(X_train)
         self.model.fit(X_train, y_train)
         
         if self.save_model:
-            with open(self.model_path, 'wb') as handle:
-                pickle.dump(self.model, handle)
+            self.save(self.model_path)
     
     
     def predict(self, X_test):
-        return discretize(self.model.predict(X_test))
+        X_test = order_features(X_test, self.feature_columns)
+        
+        if self.compiled is not None:
+            return discretize(self.compiled.predict(X_test), self.thresholds)
+        return discretize(self.model.predict(X_test), self.thresholds)
+    
+    
+    def compile(self, n_threads=1):
+        """
+        Converts the trained model into flat node tables used for prediction from now on
+        (see utils.tree_inference). Much faster for small batches; retraining drops the compiled model.
+        
+        :param n_threads: the number of threads among which the trees are divided during prediction
+        """
+        
+        self.compiled = CompiledTreeEnsemble.from_xgboost(self.model.get_booster(), n_threads=n_threads)
+    
+    
+    def save(self, path):
+        """
+        Saves the trained model as a model artifact (see utils.artifact).
+        """
+        
+        save_artifact(path, self.model, 'xgboost', self.feature_columns, self.thresholds,
+                      params={'max_depth': self.model.max_depth, 'n_estimators': self.model.n_estimators})
+    
+    
+    def load(self, path):
+        """
+        Loads the model, the feature column order and the thresholds from a model artifact.
+        """
+        
+        self.compiled = None
+        self.model, metadata = load_artifact(path)
+        self.feature_columns = metadata['feature_columns']
+        self.thresholds = metadata['thresholds']
+    
+    
+    def fit_stream(self, chunks, cache_dir=None):
+        """
+        Trains the model on chunks of data without loading the whole table.
+        Uses xgboost's external memory: the chunks are read through a data iterator
+        and cached on disk in a quantized form, so the memory used depends on the chunk size.
+        
+        :param chunks: re-iterable source of (X_chunk, y_chunk) tuples (see utils.streaming)
+        :param cache_dir: directory for xgboost's cache files; a temporary directory if not given
+        """
+        import tempfile
+        import xgboost
+        
+        self.compiled = None
+        params = self.model.get_xgb_params()
+        params['tree_method'] = 'hist'
+        n_estimators = self.model.n_estimators
+        
+        with tempfile.TemporaryDirectory(dir=cache_dir) as tmp_dir:
+            dtrain = xgboost.DMatrix(_chunk_iter(chunks, os.path.join(tmp_dir, "cache")))
+            booster = xgboost.train(params, dtrain, num_boost_round=n_estimators)
+        
+        self.model = make_regressor('xgboost', **self.model.get_params())
+        self.model.load_model(bytearray(booster.save_raw(raw_format='ubj')))
+        self.feature_columns = getattr(chunks, 'feature_columns', None)
+        
+        if self.save_model:
+            self.save(self.model_path)
+    
+    
+    def add_estimators(self, X_train, y_train, n_estimators):
+        """
+        Continues boosting the already trained model until it has n_estimators trees.
+        The existing trees are kept and only the new boosting rounds are trained.
+        """
+        
+        booster = self.model.get_booster()
+        n_rounds = n_estimators - booster.num_boosted_rounds()
+        
+        params = self.model.get_params()
+        params['n_estimators'] = n_rounds
+        
+        model = make_regressor('xgboost', **params)
+        model.fit(dense_features(X_train), y_train, xgb_model=booster)
+        self.model = model
+        self.compiled = None
+        
+        if self.save_model:
+            self.save(self.model_path)
+    
+    
+    def staged_predict(self, X_test, n_estimators_values):
+        """
+        Predicts using only the first n boosting rounds of the trained model, for each n in n_estimators_values.
+        Boosting is sequential, so this is the same as the prediction of a model trained with n_estimators=n.
+        
+        :param X_test: features
+        :param n_estimators_values: numbers of trees; each has to be at most the number of trained trees
+        :returns: list of predictions, one for each value in n_estimators_values
+        """
+        
+        n_rounds = self.model.get_booster().num_boosted_rounds()
+        if max(n_estimators_values) > n_rounds:
+            raise ValueError("The model has only " + str(n_rounds) + " trees, " + str(max(n_estimators_values)) + " requested.")
+        
+        X_test = order_features(X_test, self.feature_columns)
+        return [discretize(self.model.predict(X_test, iteration_range=(0, n_estimators)), self.thresholds) for n_estimators in n_estimators_values]
     
     
     def set_hyperparams(self, max_depth, n_estimators):
@@ -40,4 +149,35 @@ class XGBoost():
         This will delete the old model and create a new model using the given hyperparams.
         """
         
-        self.model = XGBRegressor(max_depth=max_depth, n_estimators=n_estimators, objective="reg:squarederror")  
\ No newline at end of file
+        self.compiled = None
+        self.model = make_regressor('xgboost', max_depth=max_depth, n_estimators=n_estimators, objective="reg:squarederror", random_state=self.random_state)
+
+
+def _chunk_iter(chunks, cache_prefix):
+    """
+    Wraps a source of chunks into an xgboost data iterator for external memory training.
+    """
+    import xgboost
+    
+    class ChunkIter(xgboost.DataIter):
+        
+        def __init__(self):
+            self._iterator = None
+            super().__init__(cache_prefix=cache_prefix)
+        
+        def next(self, input_data):
+            if self._iterator is None:
+                self._iterator = iter(chunks)
+            
+            try:
+                X, y = next(self._iterator)
+            except StopIteration:
+                return 0
+            
+            input_data(data=X, label=y)
+            return 1
+        
+        def reset(self):
+            self._iterator = None
+    
+    return ChunkIter()